@@ -4,52 +4,109 @@ commit: 76a0254
 Manually reproducing the base.py file here to avoid Streamlit directory permission issues.
 """
 
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import IO, Dict, List, Optional, Union
+from typing import IO, Dict, Iterator, List, Optional, Union
 
 from llama_index.readers.base import BaseReader
 from llama_index.readers.schema.base import Document
 
+from pdf_text import PageTextCache, extract_page, init_worker, page_fingerprint
+
 class PDFReader(BaseReader):
     """PDF reader."""
 
-    def load_data(
-        self, file: Union[IO[bytes], str, Path], extra_info: Optional[Dict] = None
-    ) -> List[Document]:
-        """Parse file."""
+    def __init__(
+        self,
+        num_workers: int = 1,
+        parallel_min_pages: int = 16,
+        page_cache_dir: Optional[str] = None,
+    ) -> None:
+        """
+        num_workers: processes used to extract text from documents of at least parallel_min_pages pages.
+        page_cache_dir: directory for the per-page text cache, or None to disable it.
+        """
+        self.num_workers = num_workers
+        self.parallel_min_pages = parallel_min_pages
+        self.page_cache = PageTextCache(page_cache_dir) if page_cache_dir else None
+
+    def lazy_load_data(
+        self, file: Union[IO[bytes], str, Path, bytes], extra_info: Optional[Dict] = None
+    ) -> Iterator[Document]:
+        """Parse file, yielding one Document per page in page order as soon as its text is available."""
         import pypdf
 
         # Check if the file is already a Path object, if not, create a Path object from the string
         if not isinstance(file, Path) and isinstance(file, str):
             file = Path(file)
 
-        # Open the file if it's not already open, else use it as it is
+        # Read the whole file once; worker processes and page fingerprints both need the raw bytes
         if isinstance(file, Path):
-            context = open(file, "rb")
+            data = file.read_bytes()
             if extra_info:
                 extra_info.update({"file_name": file.name})
             else:
                 extra_info = {"file_name": file.name}
+        elif isinstance(file, bytes):
+            data = file
         else:
-            context = file
+            data = file.read()
+
+        # Create a PDF object
+        pdf = pypdf.PdfReader(io.BytesIO(data))
 
-        with context as fp:
-            # Create a PDF object
-            pdf = pypdf.PdfReader(fp)
+        # Get the number of pages in the PDF document; page_labels rebuilds every label on access, so read it once
+        num_pages = len(pdf.pages)
+        page_labels = pdf.page_labels
 
-            # Get the number of pages in the PDF document
-            num_pages = len(pdf.pages)
+        texts: Dict[int, str] = {}
+        fingerprints: Dict[int, str] = {}
+        if self.page_cache is not None:
+            for page in range(num_pages):
+                fingerprints[page] = page_fingerprint(pdf.pages[page])
+                cached_text = self.page_cache.get(fingerprints[page])
+                if cached_text is not None:
+                    texts[page] = cached_text
+        missing_pages = [page for page in range(num_pages) if page not in texts]
 
+        executor = None
+        if self.num_workers > 1 and len(missing_pages) >= self.parallel_min_pages:
+            # Workers are spawned rather than forked: the app process runs the shared event loop, worker
+            # threads and HTTP clients, and a fork copies whatever locks those threads hold at that moment
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.num_workers, len(missing_pages)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(data,),
+            )
+            # map() submits every page up front, so workers keep extracting while earlier pages are consumed
+            extracted = executor.map(extract_page, missing_pages, chunksize=1)
+        else:
+            extracted = ((page, pdf.pages[page].extract_text()) for page in missing_pages)
+
+        try:
             # Iterate over every page
-            docs = []
             for page in range(num_pages):
-                # Extract the text from the page
-                page_text = pdf.pages[page].extract_text()
-                page_label = pdf.page_labels[page]
-                metadata = {"page_label": page_label}
+                if page not in texts:
+                    # Extract the text from the page
+                    extracted_page, page_text = next(extracted)
+                    texts[extracted_page] = page_text
+                    if self.page_cache is not None:
+                        self.page_cache.put(fingerprints[extracted_page], page_text)
+                metadata = {"page_label": page_labels[page]}
 
                 if extra_info is not None:
                     metadata.update(extra_info)
 
-                docs.append(Document(text=page_text, extra_info=metadata))
-            return docs
\ No newline at end of file
+                yield Document(text=texts.pop(page), extra_info=metadata)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def load_data(
+        self, file: Union[IO[bytes], str, Path, bytes], extra_info: Optional[Dict] = None
+    ) -> List[Document]:
+        """Parse file."""
+        return list(self.lazy_load_data(file, extra_info=extra_info))
@@ -0,0 +1,98 @@
+"""
+Batched top-k retrieval over a small in-memory index.
+
+All query strings are embedded in one batched call, scored against every node with a single
+query x node matrix product, and the top-k per query is selected with argpartition. Results are
+kept per query string, so the query engine's per-query retrieve calls become dictionary lookups.
+When the index uses a NumpyVectorStore its (possibly quantized) matrix is scored in place.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index import VectorStoreIndex
+from llama_index.callbacks import CallbackManager
+from llama_index.embeddings.base import BaseEmbedding
+from llama_index.retrievers import BaseRetriever
+from llama_index.schema import BaseNode, NodeWithScore, QueryBundle
+
+from numpy_vector_store import EmbeddingMatrix, NumpyVectorStore, top_k_indices
+
+
+class BatchRetriever(BaseRetriever):
+    """Cosine-similarity retriever that answers many queries with one embedding call and one matrix product."""
+
+    def __init__(
+        self,
+        nodes: Sequence[BaseNode],
+        node_embeddings: EmbeddingMatrix,
+        embed_model: BaseEmbedding,
+        similarity_top_k: int = 8,
+        callback_manager: Optional[CallbackManager] = None,
+    ) -> None:
+        super().__init__(callback_manager=callback_manager)
+        self._nodes = list(nodes)
+        self._node_embeddings = node_embeddings
+        self._embed_model = embed_model
+        self._similarity_top_k = similarity_top_k
+        self._results: Dict[str, List[NodeWithScore]] = {}
+
+    @property
+    def nodes(self) -> List[BaseNode]:
+        """Every node this retriever can return."""
+        return self._nodes
+
+    @classmethod
+    def from_index(cls, index: VectorStoreIndex, similarity_top_k: int = 8) -> "BatchRetriever":
+        """Build a batch retriever over every node stored in a vector index."""
+        if isinstance(index.vector_store, NumpyVectorStore):
+            node_ids = index.vector_store.node_ids
+            node_embeddings = index.vector_store.embeddings
+        else:
+            node_ids = list(index.index_struct.nodes_dict.values())
+            node_embeddings = EmbeddingMatrix()
+            if node_ids:
+                node_embeddings.append([index.vector_store.get(node_id) for node_id in node_ids])
+        nodes = index.docstore.get_nodes(node_ids)
+        return cls(
+            nodes,
+            node_embeddings,
+            index.service_context.embed_model,
+            similarity_top_k=similarity_top_k,
+            callback_manager=index.service_context.callback_manager,
+        )
+
+    def _rank(self, queries: List[str], query_embeddings: List[List[float]]) -> None:
+        if not self._nodes:
+            self._results.update({query: [] for query in queries})
+            return
+        scores = self._node_embeddings.similarities(np.asarray(query_embeddings, dtype=np.float32))
+        for query, row_scores, row_indices in zip(queries, scores, top_k_indices(scores, self._similarity_top_k)):
+            self._results[query] = [
+                NodeWithScore(node=self._nodes[index], score=float(row_scores[index])) for index in row_indices
+            ]
+
+    def _pending(self, queries: Sequence[str]) -> List[str]:
+        # Identical query strings are embedded and ranked only once
+        return [query for query in dict.fromkeys(queries) if query not in self._results]
+
+    def retrieve_batch(self, queries: Sequence[str]) -> Dict[str, List[NodeWithScore]]:
+        """Retrieve the top-k nodes for every query string."""
+        pending = self._pending(queries)
+        if pending:
+            # OpenAI's text-embedding-3 models embed queries and documents identically, so one batch call covers all queries
+            self._rank(pending, self._embed_model.get_text_embedding_batch(pending))
+        return {query: list(self._results[query]) for query in queries}
+
+    async def aretrieve_batch(self, queries: Sequence[str]) -> Dict[str, List[NodeWithScore]]:
+        """Asynchronously retrieve the top-k nodes for every query string."""
+        pending = self._pending(queries)
+        if pending:
+            self._rank(pending, await self._embed_model.aget_text_embedding_batch(pending))
+        return {query: list(self._results[query]) for query in queries}
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self.retrieve_batch([query_bundle.query_str])[query_bundle.query_str]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return (await self.aretrieve_batch([query_bundle.query_str]))[query_bundle.query_str]
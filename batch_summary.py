@@ -0,0 +1,136 @@
+"""
+Batch summarization of many consent documents in one process.
+
+Every document runs on the shared event loop, so all of them draw from one set of OpenAI rate
+limits, and at most BATCH_CONCURRENCY documents are in flight at a time. Each finished document is
+appended to a JSONL file and synced to disk before the next record is written. That file is also
+the checkpoint: on restart, documents whose hash already has a successful record are skipped.
+Documents are hashed by streaming them from disk and only read whole once they get a slot, so a
+batch never holds more than BATCH_CONCURRENCY documents in memory. Summaries with missing sections
+are recorded as "partial", and documents that cannot be read as "error"; both are retried on restart.
+"""
+
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, TextIO
+
+from config import BATCH_CONCURRENCY
+from generate_ki_summary import missing_sections
+from result_cache import document_hash, file_hash
+from scheduler import run
+
+SUPPORTED_SUFFIXES = (".pdf", ".docx")
+
+Summarize = Callable[[str, Optional[bytes]], Awaitable[str]]
+
+
+def expand_inputs(target: str) -> List[Path]:
+    """Return the supported documents in a directory, or matching a glob pattern, in sorted order."""
+    if os.path.isdir(target):
+        candidates = [os.path.join(target, name) for name in os.listdir(target)]
+    else:
+        candidates = glob.glob(target, recursive=True)
+    return sorted(Path(path) for path in candidates if os.path.isfile(path) and Path(path).suffix.lower() in SUPPORTED_SUFFIXES)
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """
+    Return the hashes of documents already summarized successfully. A record cut short by a crash
+    is truncated away so that new records start on a fresh line.
+    """
+    completed: Set[str] = set()
+    if not os.path.exists(output_path):
+        return completed
+    valid_bytes = 0
+    with open(output_path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            valid_bytes += len(line)
+            if record.get("status") == "ok":
+                completed.add(record["document_hash"])
+    if valid_bytes != os.path.getsize(output_path):
+        with open(output_path, "r+b") as file:
+            file.truncate(valid_bytes)
+    return completed
+
+
+def write_record(output: TextIO, record: Dict) -> None:
+    """Append one JSONL record and make sure it is on disk before returning."""
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    output.flush()
+    os.fsync(output.fileno())
+
+
+async def arun_batch(
+    documents: List[Path],
+    output_path: str,
+    summarize: Summarize,
+    concurrency: int = BATCH_CONCURRENCY
+) -> Dict[str, int]:
+    """Summarize documents not yet in output_path and return counts of what happened."""
+    completed = load_checkpoint(output_path)
+    counts = {"documents": len(documents), "ok": 0, "partial": 0, "error": 0, "skipped": 0}
+    document_slots = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        async def summarize_document(path: Path, doc_hash: Optional[str]) -> None:
+            queued_at = time.perf_counter()
+            async with document_slots:
+                started_at = time.perf_counter()
+                record = {"document": str(path), "document_hash": doc_hash, "started_at": time.time()}
+                try:
+                    file_bytes = await asyncio.to_thread(path.read_bytes)
+                    # Record the hash of what was summarized, in case the file changed since it was hashed
+                    record["document_hash"] = document_hash(file_bytes)
+                    record["summary"] = await summarize(str(path), file_bytes)
+                    record["missing_sections"] = missing_sections(record["summary"])
+                    record["status"] = "partial" if record["missing_sections"] else "ok"
+                except Exception as exc:
+                    record["status"] = "error"
+                    record["error"] = f"{type(exc).__name__}: {exc}"
+                record["queued_seconds"] = round(started_at - queued_at, 3)
+                record["seconds"] = round(time.perf_counter() - started_at, 3)
+            # The fsync runs in a worker thread, off the loop other sessions share; the lock keeps records
+            # from interleaving
+            async with write_lock:
+                await asyncio.to_thread(write_record, output, record)
+            counts[record["status"]] += 1
+            print(f"[{record['status']}] {path} ({record['seconds']}s)", file=sys.stderr)
+
+        pending = []
+        for path in documents:
+            try:
+                # Hashed off the loop thread, which other sessions share
+                doc_hash: Optional[str] = await asyncio.to_thread(file_hash, str(path))
+            except OSError:
+                # Read again in its slot, where a failure is recorded as an error
+                doc_hash = None
+            if doc_hash in completed:
+                counts["skipped"] += 1
+                continue
+            # Identical files in one batch are summarized once
+            if doc_hash is not None:
+                completed.add(doc_hash)
+            pending.append(summarize_document(path, doc_hash))
+        await asyncio.gather(*pending)
+    return counts
+
+
+def run_batch(target: str, output_path: str, summarize: Summarize, concurrency: int = BATCH_CONCURRENCY) -> Dict[str, int]:
+    """Blocking entry point for the command line."""
+    start = time.perf_counter()
+    counts = run(arun_batch(expand_inputs(target), output_path, summarize, concurrency))
+    counts["seconds"] = round(time.perf_counter() - start, 3)
+    return counts
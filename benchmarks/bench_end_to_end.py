@@ -0,0 +1,163 @@
+"""
+End-to-end generate_summary benchmark against the local fake OpenAI server.
+
+Usage: python benchmarks/bench_end_to_end.py [--users 4] [--pages 5 20] [--repeats 3] [--compare OLD.json]
+
+Everything runs offline. A FakeOpenAI server is started in-process, and the pipeline is pointed at
+it through OPENAI_API_BASE, with all caches in a temporary directory. Scenarios:
+
+  cold           one never-seen document at a time, for each --pages size
+  warm_sections  the same documents with their summaries evicted, so saved sections are reused
+  warm_index     the same documents with summaries and sections evicted, so only the index is reused
+  warm           the same documents again, answered from the summary cache
+  concurrent     --users never-seen documents submitted at once, as simultaneous app sessions would
+
+Each scenario reports p50/p95/mean latency, throughput and OpenAI calls per document. The report
+is saved as benchmarks/results/e2e-<commit>.json so runs on different commits can be compared
+with --compare. Pipeline settings such as KI_SUBQUERY_MODE or KI_RERANKER are taken from the
+environment and recorded in the report.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_openai import FakeOpenAIServer, add_server_arguments, fake_from_arguments
+from synthetic_docs import write_consent
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+REPORTED_SETTINGS = ["KI_SUBQUERY_MODE", "KI_RERANKER", "KI_CHUNKING", "KI_REUSE_SECTIONS", "KI_MAX_CONCURRENT_REQUESTS", "KI_REQUESTS_PER_MINUTE"]
+COMPARED_METRICS = ["p50_seconds", "p95_seconds", "throughput_docs_per_minute", "chat_calls_per_document", "embedding_calls_per_document"]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Linearly interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def git_revision() -> Dict[str, object]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run_scenario(server: FakeOpenAIServer, documents: List[str], summarize: Callable[[str], str], concurrency: int = 1) -> Dict[str, float]:
+    """Summarize documents with up to concurrency at once and report latency, throughput and calls."""
+    before = server.fake.stats()
+
+    def timed_summary(path: str) -> float:
+        start = time.perf_counter()
+        summarize(path)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_summary, documents))
+    wall_seconds = time.perf_counter() - start
+    after = server.fake.stats()
+    calls = {key: after[key] - before[key] for key in after}
+    return {
+        "documents": len(documents),
+        "p50_seconds": round(percentile(latencies, 0.50), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+        "mean_seconds": round(sum(latencies) / len(latencies), 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_docs_per_minute": round(60 * len(documents) / wall_seconds, 2),
+        "chat_calls_per_document": round(calls["chat"] / len(documents), 2),
+        "embedding_calls_per_document": round(calls["embeddings"] / len(documents), 2),
+        "embedded_texts_per_document": round(calls["embedded_texts"] / len(documents), 2),
+        "rate_limited_per_document": round(calls["rate_limited"] / len(documents), 2),
+    }
+
+
+def print_comparison(baseline: Dict, report: Dict) -> None:
+    print(f"\n{'scenario':<14} {'metric':<30} {baseline['commit']:>12} {report['commit']:>12} {'change':>8}")
+    for scenario, results in report["scenarios"].items():
+        for metric in COMPARED_METRICS:
+            old = baseline.get("scenarios", {}).get(scenario, {}).get(metric)
+            new = results[metric]
+            change = f"{(new - old) / old:+.1%}" if old else "n/a"
+            print(f"{scenario:<14} {metric:<30} {old if old is not None else '-':>12} {new:>12} {change:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4, help="Simultaneous documents in the concurrent scenario.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 20], help="Document sizes for the single-document scenarios.")
+    parser.add_argument("--repeats", type=int, default=3, help="Documents per size in the single-document scenarios.")
+    parser.add_argument("--format", choices=["pdf", "docx"], default="pdf")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/e2e-<commit>.json).")
+    parser.add_argument("--compare", help="Earlier report to compare against.")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(fake_from_arguments(args)).start()
+    work_dir = tempfile.mkdtemp(prefix="ki-bench-")
+    # The pipeline reads its settings at import, so point it at the fake server and scratch caches first
+    os.environ.update({"OPENAI_API_BASE": server.base_url, "OPENAI_API_KEY": "fake", "KI_CACHE_DIR": os.path.join(work_dir, "cache")})
+    os.environ.pop("KI_TRACE_DIR", None)
+    from config import SECTION_CACHE_DIR, SUMMARY_CACHE_DIR
+    from generate_ki_summary import generate_summary
+
+    try:
+        documents_dir = os.path.join(work_dir, "documents")
+        seeds = iter(range(1, 1_000_000))
+        single = [write_consent(documents_dir, pages, args.format, next(seeds)) for pages in args.pages for _ in range(args.repeats)]
+        concurrent = [write_consent(documents_dir, args.pages[0], args.format, next(seeds)) for _ in range(args.users)]
+
+        scenarios = {"cold": run_scenario(server, single, generate_summary)}
+        shutil.rmtree(SUMMARY_CACHE_DIR, ignore_errors=True)
+        scenarios["warm_sections"] = run_scenario(server, single, generate_summary)
+        shutil.rmtree(SUMMARY_CACHE_DIR, ignore_errors=True)
+        shutil.rmtree(SECTION_CACHE_DIR, ignore_errors=True)
+        scenarios["warm_index"] = run_scenario(server, single, generate_summary)
+        scenarios["warm"] = run_scenario(server, single, generate_summary)
+        scenarios["concurrent"] = run_scenario(server, concurrent, generate_summary, concurrency=args.users)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        **git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "settings": {
+            "users": args.users,
+            "pages": args.pages,
+            "repeats": args.repeats,
+            "format": args.format,
+            "server": {key: getattr(args, key) for key in ("chat_latency", "embedding_latency", "jitter", "p429", "requests_per_minute", "seed")},
+            "environment": {name: os.environ[name] for name in REPORTED_SETTINGS if name in os.environ},
+        },
+        "scenarios": scenarios,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{report['commit']}{'-dirty' if report['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            print_comparison(json.load(file), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Check that importing the pipeline stays cheap.
+
+Usage: python benchmarks/bench_import.py [--budget 0.5] [--repeats 5]
+
+Each module is imported in a fresh interpreter without OPENAI_API_KEY, as a cold Streamlit start
+or CLI run would import it. Reports the median import time and whether llama-index, the OpenAI SDK
+or Streamlit were pulled in, and exits with status 1 if a module is over the budget or loads any
+of them.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["generate_ki_summary", "batch_summary", "messages_dictionary"]
+HEAVY_MODULES = ["llama_index", "openai", "streamlit"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def time_import(module: str) -> dict:
+    environment = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=REPO_ROOT, env=environment, capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=0.5, help="Maximum median import time in seconds.")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    report, within_budget = {"budget_seconds": args.budget, "modules": {}}, True
+    for module in MODULES:
+        runs = [time_import(module) for _ in range(args.repeats)]
+        median = statistics.median(run["seconds"] for run in runs)
+        loaded = sorted({name for run in runs for name in run["loaded"]})
+        ok = median <= args.budget and not loaded
+        within_budget = within_budget and ok
+        report["modules"][module] = {"median_seconds": round(median, 4), "heavy_modules_loaded": loaded, "ok": ok}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if within_budget else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Compare rerank latency and top-N agreement of the local reranker against LLMRerank.
+
+Usage: python benchmarks/bench_rerank.py [--fixtures rerank_fixtures.json [--document consent.pdf]]
+
+The fixture set holds every sub-query in messages_dict together with its retrieved candidates.
+The committed default, benchmarks/fixtures/rerank_fixtures.json, is built offline when missing:
+a synthetic consent (synthetic_docs, fixed seed) is indexed with the fake server's hashed
+bag-of-words embeddings, so it is the same on every machine and results are comparable across
+runs and commits. --document builds a fixture set from a real consent with the configured OpenAI
+embeddings instead, written to --fixtures. LLMRerank needs OPENAI_API_KEY; the local backend does not.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from llama_index.schema import NodeWithScore, QueryBundle, TextNode
+
+from messages_dictionary import messages_dict
+from rerankers import LocalRerank, get_reranker
+
+DEFAULT_FIXTURES = os.path.join(BENCHMARKS_DIR, "fixtures", "rerank_fixtures.json")
+TOP_N = 4
+# The synthetic consent behind the default fixtures
+FIXTURE_PAGES = 10
+FIXTURE_SEED = 1
+
+
+def build_fixtures(document: Path, fixtures_path: str) -> None:
+    import generate_ki_summary as ki
+    from batch_retrieval import BatchRetriever
+    from result_cache import document_hash
+
+    service_context, vector_store_index = ki.load_or_build_index(document, document_hash(document.read_bytes()))
+    retriever = BatchRetriever.from_index(vector_store_index, similarity_top_k=ki.SIMILARITY_TOP_K)
+    queries = [query for queries in messages_dict.values() for query in queries[:-1]]
+    results = retriever.retrieve_batch(queries)
+    # Node ids are random UUIDs; number the nodes instead so the same document gives the same file
+    ids = {node.node_id: f"node-{position}" for position, node in enumerate(retriever.nodes)}
+    fixtures = {
+        "corpus": [node.get_content() for node in retriever.nodes],
+        "queries": [
+            {
+                "query": query,
+                "candidates": [{"id": ids[node.node.node_id], "text": node.node.get_content(), "score": node.score} for node in results[query]],
+            }
+            for query in dict.fromkeys(queries)
+        ],
+    }
+    os.makedirs(os.path.dirname(fixtures_path), exist_ok=True)
+    with open(fixtures_path, "w", encoding="utf-8") as file:
+        json.dump(fixtures, file, indent=2)
+
+
+def build_synthetic_fixtures(fixtures_path: str) -> None:
+    """Build fixtures from a seeded synthetic consent, embedded offline by an in-process fake server."""
+    from fake_openai import FakeOpenAI, FakeOpenAIServer
+    from synthetic_docs import write_consent
+
+    server = FakeOpenAIServer(FakeOpenAI()).start()
+    work_dir = tempfile.mkdtemp(prefix="ki-rerank-fixtures-")
+    overridden = {"OPENAI_API_BASE": server.base_url, "OPENAI_API_KEY": "fake", "KI_CACHE_DIR": os.path.join(work_dir, "cache")}
+    saved = {name: os.environ.get(name) for name in overridden}
+    # The pipeline reads these when it is imported and its embedding model is built
+    os.environ.update(overridden)
+    try:
+        document = Path(write_consent(work_dir, FIXTURE_PAGES, "pdf", FIXTURE_SEED))
+        build_fixtures(document, fixtures_path)
+    finally:
+        # LLMRerank, built later, must reach the real API
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_reranker(reranker, fixtures: dict) -> dict:
+    latencies, rankings = [], {}
+    for fixture in fixtures["queries"]:
+        candidates = [NodeWithScore(node=TextNode(id_=item["id"], text=item["text"]), score=item["score"]) for item in fixture["candidates"]]
+        start = time.perf_counter()
+        reranked = reranker.postprocess_nodes(candidates, QueryBundle(fixture["query"]))
+        latencies.append(time.perf_counter() - start)
+        rankings[fixture["query"]] = [node.node.node_id for node in reranked]
+    latencies.sort()
+    return {
+        "rankings": rankings,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--document", type=Path, help="Consent document to build the --fixtures file from, embedded by OpenAI.")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--skip-llm", action="store_true", help="Only time the local reranker.")
+    args = parser.parse_args()
+
+    if args.document is not None:
+        if os.path.abspath(args.fixtures) == DEFAULT_FIXTURES:
+            parser.error("--document needs its own --fixtures path; the default fixtures are built from a synthetic consent.")
+        build_fixtures(args.document, args.fixtures)
+    elif not os.path.exists(args.fixtures):
+        if os.path.abspath(args.fixtures) != DEFAULT_FIXTURES:
+            parser.error(f"{args.fixtures} does not exist; pass --document to build it.")
+        build_synthetic_fixtures(args.fixtures)
+    with open(args.fixtures, "r", encoding="utf-8") as file:
+        fixtures = json.load(file)
+
+    local_reranker = LocalRerank(top_n=TOP_N)
+    local_reranker.fit(fixtures["corpus"])
+    results = {"local": run_reranker(local_reranker, fixtures)}
+    if not args.skip_llm:
+        results["llm"] = run_reranker(get_reranker("llm", TOP_N), fixtures)
+
+    report = {"fixtures": args.fixtures, "queries": len(fixtures["queries"]), "top_n": TOP_N}
+    for name, result in results.items():
+        report[name] = {"mean_ms": result["mean_ms"], "p95_ms": result["p95_ms"]}
+    if "llm" in results:
+        overlaps = [
+            len(set(results["local"]["rankings"][query]) & set(results["llm"]["rankings"][query])) / TOP_N
+            for query in results["llm"]["rankings"]
+        ]
+        report["local"]["top_n_agreement_with_llm"] = round(statistics.mean(overlaps), 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
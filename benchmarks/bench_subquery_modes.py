@@ -0,0 +1,62 @@
+"""
+Compare the "synthesize" and "retrieve" sub-query modes on one consent document.
+
+Usage: python benchmarks/bench_subquery_modes.py path/to/consent.pdf [repeats]
+
+The document is indexed once (or loaded from the index cache), then every section in
+messages_dict is generated in each mode. Reports wall time, LLM calls and prompt/completion
+tokens per mode as JSON.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llama_index
+from llama_index.callbacks import TokenCountingHandler
+
+# The handler must be global so it also sees the LLM that LLMRerank builds for itself
+token_counter = TokenCountingHandler()
+llama_index.global_handler = token_counter
+
+import generate_ki_summary as ki
+from messages_dictionary import messages_dict
+from result_cache import document_hash
+
+
+async def run_sections(query_engine, subquery_mode: str) -> None:
+    await asyncio.gather(*(
+        ki.aprocess_section(section, queries, query_engine, ki.get_llm(), subquery_mode=subquery_mode)
+        for section, queries in messages_dict.items()
+    ))
+
+
+def main() -> None:
+    file_path = Path(sys.argv[1])
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    service_context, vector_store_index = ki.load_or_build_index(file_path, document_hash(file_path.read_bytes()))
+    query_engine = ki.setup_query_engine(service_context, vector_store_index)
+
+    report = {"document": file_path.name, "repeats": repeats, "modes": {}}
+    for subquery_mode in ("synthesize", "retrieve"):
+        token_counter.reset_counts()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            ki.run_on_loop(run_sections(query_engine, subquery_mode))
+        elapsed = time.perf_counter() - start
+        report["modes"][subquery_mode] = {
+            "seconds_per_document": round(elapsed / repeats, 3),
+            "llm_calls_per_document": len(token_counter.llm_token_counts) / repeats,
+            "prompt_tokens_per_document": token_counter.prompt_llm_token_count / repeats,
+            "completion_tokens_per_document": token_counter.completion_llm_token_count / repeats,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Memory and recall of NumpyVectorStore settings against llama-index's SimpleVectorStore.
+
+Usage: python benchmarks/bench_vector_store.py [--nodes 400] [--sessions 50] [--dimensions 3072 1024 256]
+
+Leaf-sized chunks of synthetic consents are embedded with the fake server's hashed bag-of-words
+vectors (no network), and every sub-query in messages_dictionary is searched. Shorter vectors
+come from the fake server's dimensions handling (hashing into fewer buckets), so their recall is
+only a rough guide to what text-embedding-3's shortened vectors give. For each store the report
+gives the memory retained per document (traced with tracemalloc), that figure for --sessions
+documents held at once, the time to search the queries one by one and, for NumpyVectorStore, in
+one batch as BatchRetriever does, and recall@k against the exact float32 top-k of a
+SimpleVectorStore at native size. Chunks built from the same sentences score identically, so
+even exact float32 search can break ties differently and fall just short of 1.0.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Sequence, Tuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import numpy as np
+from llama_index.schema import TextNode
+from llama_index.vector_stores import SimpleVectorStore
+from llama_index.vector_stores.types import VectorStoreQuery
+
+from fake_openai import DEFAULT_DIMENSIONS, embed_text
+from messages_dictionary import messages_dict
+from numpy_vector_store import VECTOR_DTYPES, NumpyVectorStore, top_k_indices
+from synthetic_docs import consent_pages
+
+WORDS_PER_CHUNK = 100
+
+
+def chunk_texts(nodes: int) -> List[str]:
+    """Return roughly leaf-sized chunks of synthetic consent text."""
+    chunks: List[str] = []
+    seed = 0
+    while len(chunks) < nodes:
+        seed += 1
+        words = " ".join(consent_pages(10, seed=seed)).split()
+        chunks.extend(" ".join(words[start:start + WORDS_PER_CHUNK]) for start in range(0, len(words), WORDS_PER_CHUNK))
+    return chunks[:nodes]
+
+
+def embed(texts: Sequence[str], dimensions: int) -> np.ndarray:
+    return np.array([embed_text(text, dimensions) for text in texts], dtype=np.float32)
+
+
+def retained_bytes(build: Callable[[], object]) -> Tuple[object, int]:
+    """Build an object and return it with the memory it still holds once temporaries are freed."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return built, retained
+
+
+def build_store(store_factory: Callable[[], object], vectors: np.ndarray) -> object:
+    nodes = [TextNode(id_=f"node-{row}", text="") for row in range(len(vectors))]
+    for node, vector in zip(nodes, vectors):
+        # Each node owns its embedding list, as it would after an embedding call; set directly, since
+        # pydantic would otherwise validate every float and dominate the run time
+        node.__dict__["embedding"] = vector.tolist()
+    store = store_factory()
+    store.add(nodes)
+    return store
+
+
+def search(store: object, queries: np.ndarray, top_k: int) -> Tuple[List[List[str]], float]:
+    start = time.perf_counter()
+    results = [store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k)).ids for query in queries]
+    return results, time.perf_counter() - start
+
+
+def recall(results: Sequence[List[str]], reference: Sequence[List[str]]) -> float:
+    return sum(len(set(found) & set(expected)) for found, expected in zip(results, reference)) / sum(len(expected) for expected in reference)
+
+
+def measure(name: str, store_factory: Callable[[], object], vectors: np.ndarray, queries: np.ndarray, reference: List[List[str]], args: argparse.Namespace) -> Dict[str, object]:
+    store, retained = retained_bytes(lambda: build_store(store_factory, vectors))
+    results, seconds = search(store, queries, args.top_k)
+    batched = {}
+    if isinstance(store, NumpyVectorStore):
+        start = time.perf_counter()
+        top_k_indices(store.embeddings.similarities(queries), args.top_k)
+        batched = {"search_ms_batched": round(1000 * (time.perf_counter() - start), 2)}
+    return {
+        "store": name,
+        "dimensions": vectors.shape[1],
+        "bytes_per_node": round(retained / len(vectors)),
+        "mb_per_document": round(retained / 2**20, 3),
+        f"mb_for_{args.sessions}_documents": round(args.sessions * retained / 2**20, 1),
+        "search_ms_one_by_one": round(1000 * seconds, 2),
+        **batched,
+        f"recall_at_{args.top_k}": round(recall(results, reference), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=400, help="Leaf chunks per document.")
+    parser.add_argument("--sessions", type=int, default=50, help="Documents held in memory at once, for the projected total.")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[DEFAULT_DIMENSIONS, 1024, 256])
+    parser.add_argument("--dtypes", nargs="+", choices=VECTOR_DTYPES, default=list(VECTOR_DTYPES))
+    parser.add_argument("--top-k", type=int, default=8)
+    args = parser.parse_args()
+
+    texts = chunk_texts(args.nodes)
+    query_texts = [query for queries in messages_dict.values() for query in queries[:-1]]
+    vectors, queries = embed(texts, DEFAULT_DIMENSIONS), embed(query_texts, DEFAULT_DIMENSIONS)
+
+    reference_store = build_store(SimpleVectorStore, vectors)
+    reference, _ = search(reference_store, queries, args.top_k)
+    del reference_store
+
+    report = [measure("simple", SimpleVectorStore, vectors, queries, reference, args)]
+    for dimensions in args.dimensions:
+        shortened, shortened_queries = embed(texts, dimensions), embed(query_texts, dimensions)
+        for dtype in args.dtypes:
+            report.append(measure(f"numpy-{dtype}", lambda: NumpyVectorStore(dtype=dtype), shortened, shortened_queries, reference, args))
+    print(json.dumps({"nodes": args.nodes, "queries": len(query_texts), "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Local stand-in for the OpenAI chat completions and embeddings endpoints.
+
+Usage: python benchmarks/fake_openai.py [--port 8765] [--chat-latency 0.3] [--p429 0.05] ...
+       then run the app with OPENAI_API_BASE=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake
+
+Responses are cheap and deterministic: embeddings are hashed bag-of-words vectors, so retrieval
+still favours chunks that share words with the query, and chat answers echo the question. LLMRerank
+prompts get a well-formed relevance list. Latency, jitter, a requests-per-minute limit and random
+429 responses are configurable, and GET / returns call counters so benchmarks can report calls per
+document. Streaming chat requests are answered as server-sent events.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+DEFAULT_DIMENSIONS = 3072
+RERANK_DOCUMENT = re.compile(r"^Document (\d+):", re.MULTILINE)
+RERANK_CANDIDATES = "Let's try this now:"
+
+
+def embed_text(text: str, dimensions: int) -> List[float]:
+    """Unit-length hashed bag-of-words vector."""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little") % dimensions] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def chat_answer(messages: List[Dict]) -> str:
+    prompt = "\n".join(message.get("content") or "" for message in messages)
+    if "Relevance" in prompt and RERANK_CANDIDATES in prompt:
+        # The choice-select template lists example documents before the real candidates
+        documents = RERANK_DOCUMENT.findall(prompt.split(RERANK_CANDIDATES, 1)[1])
+        # Rank every candidate, most relevant first, in LLMRerank's answer format
+        return "\n".join(f"Doc: {number}, Relevance: {10 - min(rank, 9)}" for rank, number in enumerate(documents))
+    question = (messages[-1].get("content") or "").strip().splitlines()[0][:120] if messages else ""
+    return f"Summary for the participant about: {question}"
+
+
+class FakeOpenAI:
+    """Configuration, counters and rate limiting shared by every request handler thread."""
+
+    def __init__(
+        self,
+        chat_latency: float = 0.0,
+        embedding_latency: float = 0.0,
+        jitter: float = 0.0,
+        p429: float = 0.0,
+        requests_per_minute: int = 0,
+        seed: int = 0,
+    ) -> None:
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.jitter = jitter
+        self.p429 = p429
+        self.requests_per_minute = requests_per_minute
+        self._random = random.Random(seed)
+        self._recent_requests: deque = deque()
+        self._lock = threading.Lock()
+        self.counts = {"chat": 0, "embeddings": 0, "embedded_texts": 0, "rate_limited": 0}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    def count(self, **amounts: int) -> None:
+        with self._lock:
+            for key, amount in amounts.items():
+                self.counts[key] += amount
+
+    def delay(self, latency: float) -> float:
+        with self._lock:
+            return max(0.0, latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def admit(self) -> Optional[float]:
+        """Return None if the request may proceed, or the Retry-After seconds of a 429."""
+        with self._lock:
+            now = time.monotonic()
+            if self._random.random() < self.p429:
+                self.counts["rate_limited"] += 1
+                return 1.0
+            if self.requests_per_minute:
+                while self._recent_requests and now - self._recent_requests[0] >= 60.0:
+                    self._recent_requests.popleft()
+                if len(self._recent_requests) >= self.requests_per_minute:
+                    self.counts["rate_limited"] += 1
+                    return 60.0 - (now - self._recent_requests[0])
+                self._recent_requests.append(now)
+            return None
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server: "FakeOpenAIServer"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self._send_json(200, self.server.fake.stats())
+
+    def do_POST(self) -> None:
+        fake = self.server.fake
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        is_embedding = self.path.endswith("/embeddings")
+        time.sleep(fake.delay(fake.embedding_latency if is_embedding else fake.chat_latency))
+
+        retry_after = fake.admit()
+        if retry_after is not None:
+            error = {"error": {"message": "Rate limit reached (fake server).", "type": "requests", "code": "rate_limit_exceeded"}}
+            self._send_json(429, error, {"retry-after": f"{retry_after:.3f}"})
+            return
+        if is_embedding:
+            self._embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            self._chat(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+    def _embeddings(self, request: Dict) -> None:
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        dimensions = request.get("dimensions") or DEFAULT_DIMENSIONS
+        self.server.fake.count(embeddings=1, embedded_texts=len(texts))
+        data = [{"object": "embedding", "index": index, "embedding": embed_text(str(text), dimensions)} for index, text in enumerate(texts)]
+        tokens = sum(len(str(text).split()) for text in texts)
+        self._send_json(200, {"object": "list", "data": data, "model": request["model"], "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat(self, request: Dict) -> None:
+        self.server.fake.count(chat=1)
+        answer = chat_answer(request["messages"])
+        prompt_tokens = sum(len((message.get("content") or "").split()) for message in request["messages"])
+        completion_tokens = len(answer.split())
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request["model"]}
+        if not request.get("stream"):
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for index, word in enumerate(answer.split(" ")):
+            delta = {"role": "assistant", "content": (" " if index else "") + word}
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded HTTP server for FakeOpenAI; start() serves it from a daemon thread."""
+
+    daemon_threads = True
+
+    def __init__(self, fake: FakeOpenAI, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.fake = fake
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Fake-server options shared by this script and the benchmarks that start the server themselves."""
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Seconds before each chat response.")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Seconds before each embeddings response.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter added to every latency.")
+    parser.add_argument("--p429", type=float, default=0.0, help="Probability of answering a request with HTTP 429.")
+    parser.add_argument("--requests-per-minute", type=int, default=0, help="Server-side request limit; 0 for none.")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def fake_from_arguments(args: argparse.Namespace) -> FakeOpenAI:
+    return FakeOpenAI(
+        chat_latency=args.chat_latency,
+        embedding_latency=args.embedding_latency,
+        jitter=args.jitter,
+        p429=args.p429,
+        requests_per_minute=args.requests_per_minute,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(fake_from_arguments(args), args.host, args.port)
+    print(f"Fake OpenAI API at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
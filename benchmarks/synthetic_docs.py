@@ -0,0 +1,136 @@
+"""
+Synthetic consent documents for benchmarks.
+
+Usage: python benchmarks/synthetic_docs.py OUTPUT_DIR [--pages 5 20 100] [--formats pdf docx]
+
+Pages are built from consent-style sentences chosen with a seeded random generator, so the same
+size and seed always give the same bytes and different seeds give documents that share no cache
+entries. PDFs are written with a minimal hand-rolled writer using the built-in Helvetica font.
+DOCX files contain only the parts docx2txt reads. Neither needs extra dependencies.
+"""
+
+import argparse
+import io
+import os
+import random
+import textwrap
+import zipfile
+from typing import List, Sequence
+from xml.sax.saxutils import escape
+
+SENTENCES = [
+    "You may be eligible to take part in this research study because you have been diagnosed with asthma.",
+    "The study drug will be compared with a placebo, which looks like the study drug but has no active ingredient.",
+    "You will be asked to visit the clinic every four weeks for a total of twelve months.",
+    "Blood samples of about two tablespoons will be collected at each visit to measure drug levels.",
+    "Some people who receive the study drug have headaches, nausea, or mild skin rash.",
+    "Your participation is voluntary and you may leave the study at any time without penalty.",
+    "Information about you will be kept confidential and stored on secure, password-protected computers.",
+    "You will receive fifty dollars for each completed study visit to cover your time and travel.",
+]
+LINES_PER_PAGE = 48
+CHARACTERS_PER_LINE = 95
+
+
+def consent_pages(pages: int, sentences_per_page: int = 30, seed: int = 0) -> List[str]:
+    """Return the text of each page of a synthetic consent. Each seed also gets a unique study code."""
+    rng = random.Random(seed)
+    study_code = f"Study {seed:06d}."
+    return [
+        " ".join([study_code] + [rng.choice(SENTENCES) for _ in range(sentences_per_page)])
+        for _ in range(pages)
+    ]
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(page_texts: Sequence[str]) -> bytes:
+    """Build a PDF with one page per text, wrapped into lines of Helvetica 10pt."""
+    font_id = 3 + 2 * len(page_texts)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * index} 0 R' for index in range(len(page_texts)))}] /Count {len(page_texts)} >>".encode(),
+    ]
+    for index, text in enumerate(page_texts):
+        lines = textwrap.wrap(text, CHARACTERS_PER_LINE)[:LINES_PER_PAGE]
+        content = "BT /F1 10 Tf 50 760 Td 14 TL " + " ".join(f"({_pdf_string(line)}) '" for line in lines) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 {font_id} 0 R >> >> "
+            f"/Contents {4 + 2 * index} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream".encode("latin-1"))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref_offset = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    output.write(b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets))
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return output.getvalue()
+
+
+def make_docx(paragraphs: Sequence[str]) -> bytes:
+    """Build a minimal .docx with one Word paragraph per string."""
+    body = "".join(f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(paragraph)}</w:t></w:r></w:p>" for paragraph in paragraphs)
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            "</Types>",
+        )
+        docx.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/>'
+            "</Relationships>",
+        )
+        docx.writestr(
+            "word/document.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f"<w:body>{body}</w:body></w:document>",
+        )
+    return output.getvalue()
+
+
+def write_consent(directory: str, pages: int, file_format: str = "pdf", seed: int = 0) -> str:
+    """Write one synthetic consent and return its path."""
+    texts = consent_pages(pages, seed=seed)
+    data = make_pdf(texts) if file_format == "pdf" else make_docx(texts)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"consent-{pages}p-{seed}.{file_format}")
+    with open(path, "wb") as file:
+        file.write(data)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 20, 100])
+    parser.add_argument("--formats", nargs="+", choices=["pdf", "docx"], default=["pdf", "docx"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for pages in args.pages:
+        for file_format in args.formats:
+            print(write_consent(args.output_dir, pages, file_format, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Leaf-only chunking.
+
+HierarchicalNodeParser builds every level of the hierarchy as nodes, with parent, child and
+sibling relationships, even when only the leaves are indexed. LeafChunker applies the same
+cascade of sentence splitters to plain strings and creates nodes only for the final level, so the
+leaves have the same text and metadata with far fewer intermediate objects.
+"""
+
+from typing import Iterable, Iterator, List, Sequence
+
+from llama_index.node_parser import SentenceSplitter
+from llama_index.schema import BaseNode, MetadataMode, NodeRelationship, TextNode
+
+
+class LeafChunker:
+    """Streams the leaf nodes HierarchicalNodeParser would produce for the same chunk sizes."""
+
+    def __init__(self, chunk_sizes: Sequence[int], chunk_overlap: int = 20) -> None:
+        self._splitters = [
+            SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap) for chunk_size in chunk_sizes
+        ]
+
+    @staticmethod
+    def _metadata_str(document: BaseNode) -> str:
+        # Splitters reserve room for whichever metadata rendering is longer, as SentenceSplitter does
+        embed_metadata_str = document.get_metadata_str(mode=MetadataMode.EMBED)
+        llm_metadata_str = document.get_metadata_str(mode=MetadataMode.LLM)
+        return max(embed_metadata_str, llm_metadata_str, key=len)
+
+    def split_text(self, document: BaseNode) -> List[str]:
+        """Return the leaf-level text chunks of one document."""
+        metadata_str = self._metadata_str(document)
+        chunks = [document.get_content(metadata_mode=MetadataMode.NONE)]
+        for splitter in self._splitters:
+            chunks = [sub_chunk for chunk in chunks for sub_chunk in splitter.split_text_metadata_aware(chunk, metadata_str)]
+        return chunks
+
+    def iter_leaf_nodes(self, documents: Iterable[BaseNode]) -> Iterator[TextNode]:
+        """Yield leaf nodes one document at a time."""
+        for document in documents:
+            source = document.as_related_node_info()
+            for chunk in self.split_text(document):
+                yield TextNode(
+                    text=chunk,
+                    metadata=dict(document.metadata),
+                    excluded_embed_metadata_keys=list(document.excluded_embed_metadata_keys),
+                    excluded_llm_metadata_keys=list(document.excluded_llm_metadata_keys),
+                    metadata_seperator=document.metadata_seperator,
+                    metadata_template=document.metadata_template,
+                    text_template=document.text_template,
+                    relationships={NodeRelationship.SOURCE: source},
+                )
+
+    def get_nodes_from_documents(self, documents: Sequence[BaseNode]) -> List[TextNode]:
+        """Return the leaf nodes of every document."""
+        return list(self.iter_leaf_nodes(documents))
@@ -0,0 +1,139 @@
+"""
+Lazily built OpenAI clients shared by the whole process.
+
+Nothing here is constructed at import time, so importing the pipeline needs neither llama-index
+nor an API key. The LLM, the reranking LLM and the embedding model are built on first use and
+then reused. Their OpenAI clients share one pooled httpx.Client, which is thread-safe and serves calls made from
+worker threads. They also share one httpx.AsyncClient, which serves calls made on the shared
+scheduler loop.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+from config import CALL_TIMEOUT_SECONDS, EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_CACHE_PATH, EMBEDDING_DIMENSIONS, EMBEDDING_REQUESTS_PER_MINUTE
+from config import EMBEDDING_TOKENS_PER_MINUTE, MAX_CONCURRENT_REQUESTS
+
+if TYPE_CHECKING:
+    import httpx
+    from llama_index.llms import OpenAI as OpenAILLM
+
+    from embedding_cache import CachedEmbedding
+
+LLM_MODEL = "gpt-4-0125-preview"
+# The model LLMRerank would build for itself
+RERANK_MODEL = "gpt-3.5-turbo"
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_llm: Optional[OpenAILLM] = None
+_rerank_llm: Optional[OpenAILLM] = None
+_embed_model: Optional[CachedEmbedding] = None
+
+
+def _api_key() -> str:
+    # Ensure OPENAI_API_KEY is set in the environment
+    api_key = os.getenv('OPENAI_API_KEY')
+    if api_key is None:
+        raise EnvironmentError("OPENAI_API_KEY not found in environment variables. Please set it before running the script.")
+    return api_key
+
+
+def _connection_limits() -> httpx.Limits:
+    import httpx
+
+    # Keep enough idle connections for every request the scheduler lets through at once
+    return httpx.Limits(max_connections=100, max_keepalive_connections=2 * MAX_CONCURRENT_REQUESTS)
+
+
+def get_http_client() -> httpx.Client:
+    """Return the process-wide pooled HTTP client for synchronous OpenAI calls."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+
+            _http_client = httpx.Client(limits=_connection_limits())
+        return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the pooled HTTP client for asynchronous OpenAI calls, which all run on the shared loop."""
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            import httpx
+
+            _async_http_client = httpx.AsyncClient(limits=_connection_limits())
+        return _async_http_client
+
+
+def _use_shared_http_clients(model: Any) -> None:
+    # llama-index would open a connection pool per model and per client type; hand it ones built
+    # from the model's own credentials and settings on top of the shared pools instead
+    from openai import AsyncOpenAI, OpenAI
+
+    credentials = model._get_credential_kwargs()
+    model._client = OpenAI(**{**credentials, "http_client": get_http_client()})
+    model._aclient = AsyncOpenAI(**{**credentials, "http_client": get_async_http_client()})
+
+
+def get_llm() -> OpenAILLM:
+    """Return the shared chat model, building it on first use."""
+    global _llm
+    if _llm is None:
+        from llama_index.llms import OpenAI as OpenAILLM
+
+        api_key = _api_key()
+        # Retries are left to the scheduler so that 429 backoff is coordinated across sessions; the client
+        # timeout matches the scheduler's, so calls it abandons in worker threads stop too
+        llm = OpenAILLM(api_key=api_key, model=LLM_MODEL, temperature=0, top_p=0.1, max_retries=0, timeout=CALL_TIMEOUT_SECONDS or 600.0)
+        _use_shared_http_clients(llm)
+        with _lock:
+            if _llm is None:
+                _llm = llm
+    return _llm
+
+
+def get_rerank_llm() -> OpenAILLM:
+    """Return the shared chat model used by the LLM reranker, building it on first use."""
+    global _rerank_llm
+    if _rerank_llm is None:
+        from llama_index.llms import OpenAI as OpenAILLM
+
+        api_key = _api_key()
+        # Built like the main LLM, so the scheduler retries and times out rerank calls too
+        llm = OpenAILLM(api_key=api_key, model=RERANK_MODEL, temperature=0, max_retries=0, timeout=CALL_TIMEOUT_SECONDS or 600.0)
+        _use_shared_http_clients(llm)
+        with _lock:
+            if _rerank_llm is None:
+                _rerank_llm = llm
+    return _rerank_llm
+
+
+def get_embed_model() -> CachedEmbedding:
+    """Return the shared embedding model, building it on first use."""
+    global _embed_model
+    if _embed_model is None:
+        from embedding_cache import CachedEmbedding, EmbeddingCache, SingleAttemptOpenAIEmbedding
+        from scheduler import set_rate_limits
+
+        api_key = _api_key()
+        # text-embedding-3 models can return shortened vectors, trading some recall for memory. As for
+        # the LLMs, retries are left to the scheduler, which CachedEmbedding sends every request through
+        openai_embedding = SingleAttemptOpenAIEmbedding(
+            model=EMBEDDING_MODEL, api_key=api_key, dimensions=EMBEDDING_DIMENSIONS or None, max_retries=0, timeout=CALL_TIMEOUT_SECONDS or 600.0
+        )
+        set_rate_limits(EMBEDDING_MODEL, EMBEDDING_REQUESTS_PER_MINUTE, EMBEDDING_TOKENS_PER_MINUTE)
+        _use_shared_http_clients(openai_embedding)
+        # Leaf chunks that were embedded before are served from the on-disk cache
+        embed_model = CachedEmbedding(openai_embedding, EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_BYTES))
+        with _lock:
+            if _embed_model is None:
+                _embed_model = embed_model
+    return _embed_model
@@ -0,0 +1,91 @@
+"""
+Runtime settings for the Key Information summary pipeline.
+
+Every value can be overridden with the environment variable of the same name prefixed by KI_.
+"""
+
+import os
+
+# Directory holding all on-disk caches
+CACHE_DIR = os.getenv("KI_CACHE_DIR", ".ki_cache")
+
+# Embedding cache: a single SQLite file of float32 vectors, evicted least-recently-used first
+EMBEDDING_CACHE_PATH = os.getenv("KI_EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("KI_EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Persisted vector indexes (one directory per document) and finished summaries
+INDEX_CACHE_DIR = os.getenv("KI_INDEX_CACHE_DIR", os.path.join(CACHE_DIR, "indexes"))
+SUMMARY_CACHE_DIR = os.getenv("KI_SUMMARY_CACHE_DIR", os.path.join(CACHE_DIR, "summaries"))
+
+# The index, summary, section and page caches hold consent text and summaries: entries unused for
+# RESULT_CACHE_MAX_AGE_SECONDS are deleted, and each of those directories is trimmed to
+# RESULT_CACHE_MAX_BYTES, least recently used first (0 disables either limit); TRACE_DIR is
+# bounded the same way
+RESULT_CACHE_MAX_AGE_SECONDS = float(os.getenv("KI_RESULT_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("KI_RESULT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Shared limits for OpenAI calls across every session in the process
+MAX_CONCURRENT_REQUESTS = int(os.getenv("KI_MAX_CONCURRENT_REQUESTS", "8"))
+REQUESTS_PER_MINUTE = int(os.getenv("KI_REQUESTS_PER_MINUTE", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("KI_TOKENS_PER_MINUTE", "300000"))
+MAX_RETRIES = int(os.getenv("KI_MAX_RETRIES", "6"))
+# Embedding requests take the same concurrency slots and retries, with the embedding model's own budget
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("KI_EMBEDDING_REQUESTS_PER_MINUTE", "3000"))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("KI_EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+
+# How sub-queries feed each section's final chat call:
+#   "synthesize" - each sub-query is reranked and answered by the LLM, and the answers become the context
+#   "retrieve"   - sub-queries only retrieve; the merged, deduplicated nodes become the context
+SUBQUERY_MODE = os.getenv("KI_SUBQUERY_MODE", "synthesize")
+
+# Reranker applied to each sub-query's retrieved nodes in "synthesize" mode: "llm", "local" (BM25 and
+# embedding-similarity fusion on the CPU, no network calls) or "none"
+RERANKER = os.getenv("KI_RERANKER", "llm")
+
+# PDF ingestion: documents with at least PDF_PARALLEL_MIN_PAGES uncached pages are extracted by
+# PDF_WORKERS processes; extracted page text is cached by page content hash
+PDF_WORKERS = int(os.getenv("KI_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("KI_PDF_PARALLEL_MIN_PAGES", "16"))
+PAGE_CACHE_DIR = os.getenv("KI_PAGE_CACHE_DIR", os.path.join(CACHE_DIR, "pages"))
+
+# Chunking: "leaf" builds only the 128-token leaves; "hierarchical" keeps every level in the
+# docstore and retrieves through an auto-merging retriever
+CHUNKING = os.getenv("KI_CHUNKING", "leaf")
+
+# Batch mode: documents summarized at the same time; their OpenAI calls share the limits above
+BATCH_CONCURRENCY = int(os.getenv("KI_BATCH_CONCURRENCY", "4"))
+
+# Tracing: one JSON trace per summary is written to TRACE_DIR (empty to disable), which is pruned
+# like the result caches; a non-zero METRICS_PORT serves process-wide metrics at
+# http://METRICS_HOST:METRICS_PORT/metrics (set METRICS_HOST to 0.0.0.0 to allow remote scrapers)
+TRACE_DIR = os.getenv("KI_TRACE_DIR", os.path.join(CACHE_DIR, "traces"))
+METRICS_HOST = os.getenv("KI_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("KI_METRICS_PORT", "0"))
+
+# Vector store for each document's leaf embeddings: "numpy" keeps them in one contiguous array,
+# stored as VECTOR_DTYPE ("float32", "float16" or "int8"); "simple" is llama-index's
+# SimpleVectorStore. A non-zero EMBEDDING_DIMENSIONS asks the embedding model for shortened vectors.
+VECTOR_STORE = os.getenv("KI_VECTOR_STORE", "numpy")
+VECTOR_DTYPE = os.getenv("KI_VECTOR_DTYPE", "float32")
+EMBEDDING_DIMENSIONS = int(os.getenv("KI_EMBEDDING_DIMENSIONS", "0"))
+
+# Context of each section's final chat call: sentences at least CONTEXT_DUPLICATE_THRESHOLD similar
+# (word-set Jaccard) to one already included are dropped, and the context is cut at
+# CONTEXT_TOKEN_BUDGET tokens (0 for no limit)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("KI_CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("KI_CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+# Section outputs, keyed by the text each section retrieved: a revised document only regenerates
+# sections whose retrieved chunks changed (set KI_REUSE_SECTIONS=0 to always regenerate)
+SECTION_CACHE_DIR = os.getenv("KI_SECTION_CACHE_DIR", os.path.join(CACHE_DIR, "sections"))
+REUSE_SECTIONS = os.getenv("KI_REUSE_SECTIONS", "1") == "1"
+
+# Tail latency: a summary stops waiting for sections DOCUMENT_DEADLINE_SECONDS after it started
+# (index build and retrieval prefetch included) and marks the rest as missing; each OpenAI call
+# attempt is abandoned and retried after CALL_TIMEOUT_SECONDS (for streamed answers, that long
+# without a new chunk, and not retried once text was shown); a call still running past the
+# HEDGE_PERCENTILE of its stage's recent latencies gets a duplicate, and the first answer wins
+# (0 disables any of these)
+DOCUMENT_DEADLINE_SECONDS = float(os.getenv("KI_DOCUMENT_DEADLINE_SECONDS", "600"))
+CALL_TIMEOUT_SECONDS = float(os.getenv("KI_CALL_TIMEOUT_SECONDS", "60"))
+HEDGE_PERCENTILE = float(os.getenv("KI_HEDGE_PERCENTILE", "0.95"))
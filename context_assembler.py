@@ -0,0 +1,80 @@
+"""
+Assembles the context of a section's final chat call.
+
+Passages arrive most important first: sub-query answers in query order, or retrieved chunks by
+descending score. Sentences are split out and any sentence that is a near-duplicate of one
+already kept (word-set Jaccard similarity at or above the threshold) is dropped, so facts repeated
+across answers or overlapping chunks are sent once. Passages are then added in order, sentence by
+sentence, until the token budget is spent. The same passages always give the same context.
+"""
+
+import re
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+
+from scheduler import count_tokens
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"\w+")
+# Sentences shorter than this are only dropped when repeated exactly, since a few shared words say little
+MIN_NEAR_DUPLICATE_WORDS = 5
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _words(sentence: str) -> FrozenSet[str]:
+    return frozenset(WORD.findall(sentence.lower()))
+
+
+def _is_near_duplicate(words: FrozenSet[str], kept: Sequence[FrozenSet[str]], threshold: float) -> bool:
+    if len(words) < MIN_NEAR_DUPLICATE_WORDS:
+        return words in kept
+    return any(
+        len(words & other) / len(words | other) >= threshold
+        for other in kept
+        if len(other) >= MIN_NEAR_DUPLICATE_WORDS
+    )
+
+
+def assemble_context(passages: Sequence[Tuple[str, str]], token_budget: int = 0, duplicate_threshold: float = 0.8) -> Tuple[str, Dict[str, int]]:
+    """
+    Join (heading, text) passages into one context, dropping near-duplicate sentences and stopping at
+    token_budget tokens (0 for no limit). A heading such as "Q: ...\\nA: " is kept verbatim before its
+    passage's sentences; passages left without sentences are dropped. Returns the context and
+    token and sentence counts for tracing.
+    """
+    kept_words: List[FrozenSet[str]] = []
+    blocks: List[str] = []
+    tokens = input_tokens = duplicates = truncated = 0
+    budget_spent = False
+    for heading, text in passages:
+        sentences = split_sentences(text)
+        input_tokens += count_tokens(heading) + sum(count_tokens(sentence) for sentence in sentences)
+        if budget_spent:
+            truncated += len(sentences)
+            continue
+        block_sentences: List[str] = []
+        block_tokens = count_tokens(heading)
+        for index, sentence in enumerate(sentences):
+            words = _words(sentence)
+            if _is_near_duplicate(words, kept_words, duplicate_threshold):
+                duplicates += 1
+                continue
+            sentence_tokens = count_tokens(sentence)
+            if token_budget and tokens + block_tokens + sentence_tokens > token_budget:
+                budget_spent = True
+                truncated += len(sentences) - index
+                break
+            kept_words.append(words)
+            block_sentences.append(sentence)
+            block_tokens += sentence_tokens
+        if block_sentences:
+            blocks.append(heading + " ".join(block_sentences))
+            tokens += block_tokens
+    return "\n\n".join(blocks), {
+        "context_tokens": tokens,
+        "context_input_tokens": input_tokens,
+        "duplicate_sentences": duplicates,
+        "truncated_sentences": truncated,
+    }
@@ -6,8 +6,9 @@ Manually reproducing the base.py file here to avoid Streamlit directory permissi
 
 """Read Microsoft Word files."""
 
+import io
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import IO, Dict, Iterator, List, Optional, Union
 
 from llama_index.readers.base import BaseReader
 from llama_index.readers.schema.base import Document
@@ -17,15 +18,30 @@ class DocxReader(BaseReader):
     """Docx Reader."""
 
     def load_data(
-        self, file: Path, extra_info: Optional[Dict] = None
+        self, file: Union[IO[bytes], str, Path, bytes], extra_info: Optional[Dict] = None
     ) -> List[Document]:
         """Parse file."""
         import docx2txt
 
+        if isinstance(file, str):
+            file = Path(file)
+
+        # docx2txt opens the document as a zip archive, which also works on in-memory bytes
+        if isinstance(file, Path):
+            metadata = {"file_name": file.name}
+        else:
+            metadata = {}
+            if isinstance(file, bytes):
+                file = io.BytesIO(file)
         text = docx2txt.process(file)
-        metadata = {"file_name": file.name}
 
         if extra_info is not None:
             metadata.update(extra_info)
 
-        return [Document(text=text, extra_info=metadata)]
\ No newline at end of file
+        return [Document(text=text, extra_info=metadata)]
+
+    def lazy_load_data(
+        self, file: Union[IO[bytes], str, Path, bytes], extra_info: Optional[Dict] = None
+    ) -> Iterator[Document]:
+        """Parse file; a Word document is always read as a single Document."""
+        yield from self.load_data(file, extra_info=extra_info)
\ No newline at end of file
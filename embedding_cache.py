@@ -0,0 +1,213 @@
+"""
+Persistent, content-addressed cache for embedding vectors.
+
+Vectors are keyed by a SHA-256 of the embedding model name and the exact text, and are stored
+as packed float32 blobs in a single SQLite file. SQLite handles locking between processes and
+WAL mode lets readers proceed while another session is writing, so every Streamlit session can
+share the same cache file.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.bridge.pydantic import PrivateAttr
+from llama_index.embeddings import OpenAIEmbedding
+from llama_index.embeddings.base import BaseEmbedding, Embedding
+
+from scheduler import call_with_limits, count_tokens, run
+
+
+def embedding_cache_key(model_key: str, kind: str, text: str) -> str:
+    """Return the content address for a text embedded by the given model."""
+    digest = hashlib.sha256()
+    for part in (model_key, kind, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding store with a size limit and least-recently-used eviction."""
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Embedding]:
+        """Return the cached vectors for whichever of the keys are present."""
+        found: Dict[str, Embedding] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        conn = self._connection()
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+        if found:
+            with conn:
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(time.time(), key) for key in found])
+        return found
+
+    def put_many(self, items: Dict[str, Embedding]) -> None:
+        """Store vectors, then evict the least recently used entries if the cache is over its size limit."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)", rows)
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM embeddings ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embedding model so that texts already in the cache are never embedded again."""
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+    _model_key: str = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any) -> None:
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._cache = cache
+        # Reduced-dimension embeddings are different vectors, so they get their own key space
+        dimensions = getattr(embed_model, "dimensions", None)
+        self._model_key = embed_model.model_name if dimensions is None else f"{embed_model.model_name}:{dimensions}"
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        """Vector size requested from the wrapped model, or None for the model's native size."""
+        return getattr(self._embed_model, "dimensions", None)
+
+    def _split_hits(self, kind: str, texts: List[str]) -> Tuple[List[str], Dict[str, Embedding], Dict[str, str]]:
+        keys = [embedding_cache_key(self._model_key, kind, text) for text in texts]
+        cached = self._cache.get_many(keys)
+        # Identical texts within one batch are only embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        return keys, cached, missing
+
+    async def _aembed_cached(
+        self, kind: str, texts: List[str], aembed_fn: Callable[[List[str]], Awaitable[List[Embedding]]]
+    ) -> List[Embedding]:
+        # SQLite calls block, for up to the busy timeout while another session writes, so they run in
+        # worker threads rather than on the event loop every session shares
+        keys, cached, missing = await asyncio.to_thread(self._split_hits, kind, texts)
+        if missing:
+            missing_texts = list(missing.values())
+            # Misses are embedded under the shared concurrency limit and the model's rate limits, so a
+            # 429 backs off together with every other call; queries are embedded one request each
+            vectors = await call_with_limits(
+                self.model_name,
+                sum(count_tokens(text) for text in missing_texts),
+                lambda: aembed_fn(missing_texts),
+                requests=len(missing_texts) if kind == "query" else 1,
+                stage="embedding",
+            )
+            new_vectors = dict(zip(missing, vectors))
+            await asyncio.to_thread(self._cache.put_many, new_vectors)
+            cached.update(new_vectors)
+        return [cached[key] for key in keys]
+
+    async def _aembed_queries(self, queries: List[str]) -> List[Embedding]:
+        return [await self._embed_model._aget_query_embedding(query) for query in queries]
+
+    # The synchronous methods are called from worker threads, such as the index build; their requests
+    # run on the shared loop like every other OpenAI call
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return run(self._aget_query_embedding(query))
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return (await self._aembed_cached("query", [query], self._aembed_queries))[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return run(self._aget_text_embedding(text))
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aembed_cached("text", [text], self._embed_model._aget_text_embeddings))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return run(self._aget_text_embeddings(texts))
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._aembed_cached("text", texts, self._embed_model._aget_text_embeddings)
+
+
+class SingleAttemptOpenAIEmbedding(OpenAIEmbedding):
+    """
+    OpenAIEmbedding whose asynchronous requests skip llama-index's own retry loop, which would
+    retry a 429 up to six times with its own backoff before the scheduler saw it. CachedEmbedding
+    only uses these methods, and retries through the scheduler.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SingleAttemptOpenAIEmbedding"
+
+    async def _aembed(self, texts: List[str], engine: str) -> List[Embedding]:
+        # Newlines are replaced as llama-index does, so vectors match those it would have returned
+        texts = [text.replace("\n", " ") for text in texts]
+        response = await self._get_aclient().embeddings.create(input=texts, model=engine, **self.additional_kwargs)
+        return [item.embedding for item in response.data]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return (await self._aembed([query], self._query_engine))[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aembed([text], self._text_engine))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._aembed(texts, self._text_engine)
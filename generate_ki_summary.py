@@ -1,82 +1,296 @@
+from __future__ import annotations
+
 import os
-import concurrent.futures
+import asyncio
 from pathlib import Path
-from typing import Dict, List, Tuple
-from llama_index.embeddings import OpenAIEmbedding
-from llama_index.indices.postprocessor import LLMRerank
-from llama_index.llms import OpenAI as OpenAILLM, ChatMessage
-from llama_index.node_parser import HierarchicalNodeParser, get_leaf_nodes
-from llama_index.query_engine import RetrieverQueryEngine
-from llama_index.schema import BaseNode
-from llama_index import ServiceContext, VectorStoreIndex, download_loader, StorageContext
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from messages_dictionary import messages_dict
-from sys import argv
+import argparse
 import json
-from PDFReader import PDFReader
-from docxReader import DocxReader
+from clients import RERANK_MODEL, get_embed_model, get_llm
+from result_cache import document_hash, fingerprint, load_index, save_index, load_summary, save_summary, load_section, save_section, start_pruning
+from scheduler import StreamInterrupted, call_with_limits, count_tokens, run as run_on_loop, stream_chunks
+from tracing import metrics, record_exception, span, timed, trace
+from context_assembler import assemble_context
+from config import INDEX_CACHE_DIR, SUMMARY_CACHE_DIR, SUBQUERY_MODE, RERANKER, CHUNKING, VECTOR_STORE, VECTOR_DTYPE
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_DUPLICATE_THRESHOLD, SECTION_CACHE_DIR, REUSE_SECTIONS, DOCUMENT_DEADLINE_SECONDS, CALL_TIMEOUT_SECONDS
+from config import PAGE_CACHE_DIR, PDF_WORKERS, PDF_PARALLEL_MIN_PAGES, BATCH_CONCURRENCY
 import re
-import streamlit as st
+import time
+
+# llama-index and the OpenAI SDK take seconds to import; they are imported where they are first used
+if TYPE_CHECKING:
+    from llama_index import ServiceContext, StorageContext, VectorStoreIndex
+    from llama_index.embeddings import BaseEmbedding
+    from llama_index.llms import OpenAI as OpenAILLM, ChatMessage
+    from llama_index.query_engine import RetrieverQueryEngine
+    from llama_index.retrievers import BaseRetriever
+    from llama_index.schema import BaseNode, NodeWithScore
+    from batch_retrieval import BatchRetriever
+
+CHUNK_SIZES = [512, 256, 128]
+# Revisions of a consent are uploaded under new file names; keeping the name out of the chunk text
+# lets unchanged chunks keep their boundaries, embeddings and section outputs
+EXCLUDED_METADATA_KEYS = ["file_name"]
+SIMILARITY_TOP_K = 8
+RERANK_TOP_N = 4
+
+# Rough token budgets used to reserve tokens-per-minute before a call is made
+RERANK_PROMPT_TOKENS = SIMILARITY_TOP_K * CHUNK_SIZES[-1] + 500
+SYNTHESIS_PROMPT_TOKENS = RERANK_TOP_N * CHUNK_SIZES[-1] + 500
+CHAT_COMPLETION_TOKENS = 500
+
+SYSTEM_PROMPT = (
+    "## YOUR ROLE\n"
+    "You are a bioethicist specializing in patient advocacy and human subjects research. Your focus is on interpreting and explaining Informed Consent documents to potential human subjects research participants.\n\n"
+    "## RULES\n"
+    "- Ensure all responses are directly grounded in the context you are provided.\n"
+    "- Responses should be clear and authoritative, delivered in a more formal tone.\n"
+    "- Avoid conjunctive adverbs, discourse markers, and both introductory and conclusive statements.\n"
+    "- Do not include disclaimers or refer to yourself as an AI.\n"
+    "- Provide information in a way that is clear and understandable to potential research participants.\n"
+    "- Prioritize accuracy and relevance in your responses. Do not include unnecessary information."
+)
+
+# Fixed text for sections that are not generated from the document
+PREDEFINED_ENTRIES = {
+    "section2": "A research study is different from the regular medical care you receive from your doctor. Research studies hope to make discoveries and learn new information about diseases and how to treat them. You should consider the reasons why you might want to join a research study or why it is not the best decision for you at this time.",
+    "section3": "Research studies do not always offer the possibility of treating your disease or condition. Research studies also have different kinds of risks and risk levels, depending on the type of the study. You may also need to think about other requirements for being in the study. For example, some studies require you to travel to scheduled visits at the study site in Ann Arbor or elsewhere. This may require you to arrange travel, change work schedules, find child care, or make other plans. In your decision to participate in this study, consider all of these matters carefully."
+}
+
+def index_fingerprint(embed_model: BaseEmbedding) -> str:
+    """
+    Hash of every setting that changes the parsed and embedded document.
+    """
+    return fingerprint({
+        "embed_model": embed_model.model_name,
+        "dimensions": getattr(embed_model, "dimensions", None),
+        "chunk_sizes": CHUNK_SIZES,
+        "chunking": CHUNKING,
+        "excluded_metadata_keys": EXCLUDED_METADATA_KEYS,
+        "vector_store": VECTOR_STORE,
+        "vector_dtype": VECTOR_DTYPE if VECTOR_STORE == "numpy" else None,
+    })
+
+def pipeline_settings(llm: OpenAILLM, embed_model: BaseEmbedding) -> Dict[str, object]:
+    """
+    Every setting, other than the prompts in messages_dict, that changes a section's answer.
+    """
+    return {
+        "index": index_fingerprint(embed_model),
+        "system_prompt": SYSTEM_PROMPT,
+        "llm": {
+            "model": llm.model,
+            "temperature": llm.temperature,
+            "max_tokens": llm.max_tokens,
+            "additional_kwargs": llm.additional_kwargs,
+        },
+        "similarity_top_k": SIMILARITY_TOP_K,
+        "rerank_top_n": RERANK_TOP_N,
+        "reranker": RERANKER,
+        "rerank_model": RERANK_MODEL if RERANKER == "llm" else None,
+        "subquery_mode": SUBQUERY_MODE,
+        "context_token_budget": CONTEXT_TOKEN_BUDGET,
+        "context_duplicate_threshold": CONTEXT_DUPLICATE_THRESHOLD,
+    }
+
+def summary_fingerprint(llm: OpenAILLM, embed_model: BaseEmbedding) -> str:
+    """
+    Hash of every setting that changes the generated summary for a given document.
+    """
+    return fingerprint({
+        **pipeline_settings(llm, embed_model),
+        "messages": messages_dict,
+        "predefined_entries": PREDEFINED_ENTRIES,
+    })
 
-# Ensure OPENAI_API_KEY is set in the environment
-api_key = os.getenv('OPENAI_API_KEY')
-if api_key is None:
-    raise EnvironmentError("OPENAI_API_KEY not found in environment variables. Please set it before running the script.")
+def process_documents(file_path: Path, file_bytes: Optional[bytes] = None) -> Iterator[List[BaseNode]]:
+    """
+    Yield batches of nodes while the document is still being parsed, so that embedding overlaps
+    with text extraction. In "leaf" chunking mode only the leaf chunks are built; in "hierarchical"
+    mode every level is kept for auto-merging retrieval. When file_bytes is given, file_path only
+    names the document.
+    """
+    from llama_index.node_parser import HierarchicalNodeParser, get_leaf_nodes
 
-# Initialize embedding model and LLM
-embed_model = OpenAIEmbedding(model="text-embedding-3-large")
-llm = OpenAILLM(api_key=api_key, model="gpt-4-0125-preview", temperature=0, top_p=0.1)
+    from chunking import LeafChunker
+    from docxReader import DocxReader
+    from PDFReader import PDFReader
 
-def process_documents(file_path: Path) -> List[BaseNode]:
+    embed_batch_size = get_embed_model().embed_batch_size
     if file_path.suffix == ".docx":
         loader = DocxReader()
     elif file_path.suffix == ".pdf":
-        loader = PDFReader()
-    documents = loader.load_data(file=file_path)
-    node_parser_instance = HierarchicalNodeParser.from_defaults(chunk_sizes=[512, 256, 128])
-    nodes = node_parser_instance.get_nodes_from_documents(documents)
-    return get_leaf_nodes(nodes)
-
-def create_service_and_storage_contexts(llm: OpenAILLM, embed_model: OpenAIEmbedding, nodes: List[BaseNode]) -> Tuple[ServiceContext, StorageContext, VectorStoreIndex]:
-    service_context = ServiceContext.from_defaults(llm=llm, embed_model=embed_model)
-    storage_context = StorageContext.from_defaults()
-    storage_context.docstore.add_documents(nodes)
-    vector_store_index = VectorStoreIndex(nodes, storage_context=storage_context, service_context=service_context)
+        loader = PDFReader(num_workers=PDF_WORKERS, parallel_min_pages=PDF_PARALLEL_MIN_PAGES, page_cache_dir=PAGE_CACHE_DIR)
+    source = file_bytes if file_bytes is not None else file_path
+    if CHUNKING == "hierarchical":
+        node_parser_instance = HierarchicalNodeParser.from_defaults(chunk_sizes=CHUNK_SIZES)
+    else:
+        node_parser_instance = LeafChunker(CHUNK_SIZES)
+    batch: List[BaseNode] = []
+    leaf_count = 0
+    for document in loader.lazy_load_data(file=source, extra_info={"file_name": file_path.name}):
+        document.excluded_embed_metadata_keys = list(EXCLUDED_METADATA_KEYS)
+        document.excluded_llm_metadata_keys = list(EXCLUDED_METADATA_KEYS)
+        nodes = node_parser_instance.get_nodes_from_documents([document])
+        batch.extend(nodes)
+        leaf_count += len(get_leaf_nodes(nodes))
+        # Fill whole embedding requests rather than sending one small request per page
+        if leaf_count >= embed_batch_size:
+            yield batch
+            batch = []
+            leaf_count = 0
+    if batch:
+        yield batch
+
+def create_service_and_storage_contexts(llm: OpenAILLM, embed_model: BaseEmbedding, node_batches: Iterable[List[BaseNode]]) -> Tuple[ServiceContext, StorageContext, VectorStoreIndex]:
+    from llama_index import ServiceContext, StorageContext, VectorStoreIndex
+    from llama_index.node_parser import get_leaf_nodes
+
+    from trace_handler import get_callback_manager
+
+    service_context = ServiceContext.from_defaults(llm=llm, embed_model=embed_model, callback_manager=get_callback_manager())
+    if VECTOR_STORE == "numpy":
+        from numpy_vector_store import NumpyVectorStore
+
+        storage_context = StorageContext.from_defaults(vector_store=NumpyVectorStore(dtype=VECTOR_DTYPE))
+    else:
+        storage_context = StorageContext.from_defaults()
+    vector_store_index = VectorStoreIndex([], storage_context=storage_context, service_context=service_context)
+    for nodes in node_batches:
+        # Every level goes in the docstore so parents can be merged in; only the leaves are embedded
+        storage_context.docstore.add_documents(nodes)
+        vector_store_index.insert_nodes(get_leaf_nodes(nodes))
     return service_context, storage_context, vector_store_index
 
 def setup_query_engine(service_context: ServiceContext, vector_store_index: VectorStoreIndex) -> RetrieverQueryEngine:
-    automerging_retriever = vector_store_index.as_retriever(similarity_top_k=8)
-    rerank_processor = LLMRerank(top_n=4)
-    query_engine = RetrieverQueryEngine.from_args(retriever=automerging_retriever, node_postprocessors=[rerank_processor], verbose=True, service_context=service_context)
+    from llama_index.query_engine import RetrieverQueryEngine
+    from llama_index.retrievers import AutoMergingRetriever
+
+    from batch_retrieval import BatchRetriever
+    from rerankers import get_reranker
+
+    retriever = BatchRetriever.from_index(vector_store_index, similarity_top_k=SIMILARITY_TOP_K)
+    rerank_processor = get_reranker(RERANKER, RERANK_TOP_N, retriever.nodes, callback_manager=service_context.callback_manager)
+    if CHUNKING == "hierarchical":
+        # Replace leaves with their parent when enough of the parent's children were retrieved
+        retriever = AutoMergingRetriever(retriever, vector_store_index.storage_context, callback_manager=service_context.callback_manager)
+    node_postprocessors = [rerank_processor] if rerank_processor is not None else []
+    query_engine = RetrieverQueryEngine.from_args(retriever=retriever, node_postprocessors=node_postprocessors, verbose=True, service_context=service_context)
     return query_engine
 
-def process_query(query_engine: RetrieverQueryEngine, query_text: str) -> str:
-    response = "{}".format(query_engine.query(query_text))
-    return response
-
-def formulate_chat_query(llm: OpenAILLM, context: str, query_text: str) -> str:
-    chat_response = llm.chat(messages=[
-        ChatMessage(role="system", content=(
-            "## YOUR ROLE\n"
-            "You are a bioethicist specializing in patient advocacy and human subjects research. Your focus is on interpreting and explaining Informed Consent documents to potential human subjects research participants.\n\n"
-            "## RULES\n"
-            "- Ensure all responses are directly grounded in the context you are provided.\n"
-            "- Responses should be clear and authoritative, delivered in a more formal tone.\n"
-            "- Avoid conjunctive adverbs, discourse markers, and both introductory and conclusive statements.\n"
-            "- Do not include disclaimers or refer to yourself as an AI.\n"
-            "- Provide information in a way that is clear and understandable to potential research participants.\n"
-            "- Prioritize accuracy and relevance in your responses. Do not include unnecessary information."
-        )),
+def get_batch_retriever(query_engine: RetrieverQueryEngine) -> BatchRetriever:
+    """
+    Return the batch retriever doing the vector search, unwrapping the auto-merging retriever if there is one.
+    """
+    from llama_index.retrievers import AutoMergingRetriever
+
+    retriever = query_engine.retriever
+    if isinstance(retriever, AutoMergingRetriever):
+        retriever = retriever._vector_retriever
+    return retriever
+
+async def aprocess_query(query_engine: RetrieverQueryEngine, llm: OpenAILLM, query_text: str, priority: int = 0) -> str:
+    """
+    Run a sub-query under the shared rate limits at the given priority. llama-index's query
+    engine is synchronous, so retrieval with reranking and then synthesis each run in a worker
+    thread; an LLM rerank is budgeted under the rerank model and synthesis under llm.
+    """
+    from llama_index.schema import QueryBundle
+
+    query_bundle = QueryBundle(query_text)
+    with span("query", query=query_text):
+        if RERANKER == "llm":
+            nodes = await call_with_limits(
+                RERANK_MODEL,
+                count_tokens(query_text) + RERANK_PROMPT_TOKENS,
+                lambda: asyncio.to_thread(query_engine.retrieve, query_bundle),
+                stage="rerank",
+                priority=priority
+            )
+        else:
+            nodes = await asyncio.to_thread(query_engine.retrieve, query_bundle)
+        response = await call_with_limits(
+            llm.model,
+            count_tokens(query_text) + SYNTHESIS_PROMPT_TOKENS,
+            lambda: asyncio.to_thread(query_engine.synthesize, query_bundle, nodes),
+            stage="subquery",
+            priority=priority
+        )
+    return "{}".format(response)
+
+async def aretrieve_context(retriever: BaseRetriever, queries: List[str]) -> List[str]:
+    """
+    Retrieve nodes for every sub-query without any LLM calls, and return the text of each node
+    once, ordered by its best score.
+    """
+    results = await asyncio.gather(*(retriever.aretrieve(query) for query in queries), return_exceptions=True)
+    merged_nodes: Dict[str, NodeWithScore] = {}
+    for query, nodes in zip(queries, results):
+        if isinstance(nodes, Exception):
+            record_exception("subquery_failed", nodes, query=query)
+            continue
+        for node in nodes:
+            best = merged_nodes.get(node.node.node_id)
+            if best is None or (node.score or 0.0) > (best.score or 0.0):
+                merged_nodes[node.node.node_id] = node
+    ranked_nodes = sorted(merged_nodes.values(), key=lambda node: (-(node.score or 0.0), node.node.node_id))
+    return [node.node.get_content() for node in ranked_nodes]
+
+async def asection_cache_path(section: str, queries: List[str], retriever: BaseRetriever, settings: Dict[str, object]) -> str:
+    """
+    Cache file for a section's output, keyed by its prompts, the pipeline settings and the text of
+    the nodes each sub-query retrieves, in rank order. Retrieval is served from the prefetched
+    results, so no API calls are made.
+    """
+    results = await asyncio.gather(*(retriever.aretrieve(query) for query in queries[:-1]))
+    retrieved = [[document_hash(node.node.get_content().encode("utf-8")) for node in nodes] for nodes in results]
+    key = fingerprint({"settings": settings, "queries": queries, "retrieved": retrieved})
+    return os.path.join(SECTION_CACHE_DIR, f"{section}-{key[:32]}.json")
+
+def chat_messages(context: str, query_text: str) -> List[ChatMessage]:
+    from llama_index.llms import ChatMessage
+
+    # Shared content first: every call starts with the same system prompt, a prefix the provider can cache
+    return [
+        ChatMessage(role="system", content=SYSTEM_PROMPT),
         ChatMessage(role="user", content=f"RELEVANT STUDY INFORMATION:\n\n{context}"),
         ChatMessage(role="user", content=query_text)
-    ])
-    return chat_response.message.content
+    ]
 
-def process_query_concurrently(query_engine: RetrieverQueryEngine, query_text: str) -> str:
+async def aformulate_chat_query(
+    llm: OpenAILLM,
+    context: str,
+    query_text: str,
+    on_token: Optional[Callable[[str], None]] = None,
+    priority: int = 0
+) -> str:
     """
-    Function to be used with concurrent.futures for processing queries.
+    Ask the chat model for a section's final answer at the given scheduling priority. When on_token
+    is given the answer is streamed and on_token receives each new piece of text as it arrives.
     """
-    response = "{}".format(query_engine.query(query_text))
-    return response
+    messages = chat_messages(context, query_text)
+    estimated_tokens = sum(count_tokens(message.content) for message in messages) + CHAT_COMPLETION_TOKENS
+    if on_token is None:
+        chat_response = await call_with_limits(llm.model, estimated_tokens, lambda: llm.achat(messages=messages), stage="final_answer", priority=priority)
+        return chat_response.message.content
+
+    async def stream_chat() -> str:
+        chat_response = None
+        shown = False
+        try:
+            async for chat_response in stream_chunks(await llm.astream_chat(messages=messages)):
+                delta = chat_response.delta or ""
+                shown = shown or bool(delta)
+                on_token(delta)
+        except asyncio.TimeoutError:
+            if shown:
+                # A retry would stream the answer again after the text already shown
+                raise StreamInterrupted(f"answer stalled for over {CALL_TIMEOUT_SECONDS} seconds") from None
+            raise
+        return chat_response.message.content if chat_response is not None else ""
+
+    return await call_with_limits(llm.model, estimated_tokens, stream_chat, stage="final_answer", stream=True, priority=priority)
 
 def cleanup_text(text: str) -> str:
     # Remove unwanted characters and sequences
@@ -85,6 +299,15 @@ def cleanup_text(text: str) -> str:
     clean_text = re.sub(r'\s+', ' ', clean_text).strip()
     return clean_text
 
+def missing_section_note(section: str, reason: str) -> str:
+    return f"[{section} is missing: {reason}]"
+
+def missing_sections(summary: str) -> List[str]:
+    """
+    Return the sections a partial summary marks as missing.
+    """
+    return re.findall(r"^\[(\w+) is missing: [^\]]*\]$", summary, re.MULTILINE)
+
 def remove_empty_sections(final_responses: Dict[str, str]) -> Dict[str, str]:
     """
     Removes any sections from final_responses that are empty, null, contain only a space,
@@ -93,72 +316,222 @@ def remove_empty_sections(final_responses: Dict[str, str]) -> Dict[str, str]:
     filtered_responses = {k: v for k, v in final_responses.items() if v.strip() not in {"", "' '"}}
     return filtered_responses
 
-def process_section(
+async def aprocess_section(
     section: str,
     queries: List[str],
     query_engine: RetrieverQueryEngine,
-    llm: OpenAILLM
+    llm: OpenAILLM,
+    subquery_mode: str = SUBQUERY_MODE,
+    on_token: Optional[Callable[[str, str], None]] = None,
+    cache_path: Optional[str] = None,
+    priority: int = 0
 ) -> Tuple[str, str]:
-    context_responses = {}
-    final_response = ""
-
-    # If there are multiple queries, process all but the last one concurrently
-    if len(queries) > 1:
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Submit concurrent tasks for all but the last query
-            futures = [executor.submit(process_query_concurrently, query_engine, query) for query in queries[:-1]]
-            for future, query in zip(futures, queries[:-1]):
-                try:
-                    response = future.result()
-                    context_responses[query] = cleanup_text(response)
-                except Exception as exc:
-                    st.write(f'Query "{query}" generated an exception: {exc}')
-
-    # Combine responses to form the context
-    context = "\n\n".join([f"Q: {query}\nA: {response}" for query, response in context_responses.items()])
-    cleaned_context = cleanup_text(context)
-
-    # Process the final query using the cleaned context with the chat model
-    if queries:
-        final_query_text = queries[-1]  # Ensure there's at least one query
-        final_response = formulate_chat_query(llm, cleaned_context, final_query_text)
-        final_response = cleanup_text(final_response)  # Apply cleanup to the final response
-
-    return section, final_response
-
-def generate_summary(file_path: str) -> str:
+    """
+    Answer one section, making its calls at the given scheduling priority. With a cache_path, an
+    output cached there is returned without any calls, and a newly generated output is cached
+    there unless a sub-query failed.
+    """
+    with span("section", section=section, subqueries=max(len(queries) - 1, 0), mode=subquery_mode) as section_span:
+        if cache_path is not None:
+            cached_response = load_section(cache_path)
+            section_span.set(reused=cached_response is not None)
+            if cached_response is not None:
+                return section, cached_response
+
+        context_responses = {}
+        failed_subqueries = 0
+        final_response = ""
+
+        if subquery_mode == "retrieve":
+            # Sub-queries only retrieve; their merged nodes are the context for a single chat call
+            node_texts = await aretrieve_context(query_engine.retriever, queries[:-1]) if len(queries) > 1 else []
+            passages = [("", cleanup_text(text)) for text in node_texts]
+        else:
+            # If there are multiple queries, process all but the last one concurrently
+            if len(queries) > 1:
+                results = await asyncio.gather(
+                    *(aprocess_query(query_engine, llm, query, priority) for query in queries[:-1]), return_exceptions=True
+                )
+                for query, response in zip(queries[:-1], results):
+                    if isinstance(response, Exception):
+                        failed_subqueries += 1
+                        record_exception("subquery_failed", response, section=section, query=query)
+                    else:
+                        context_responses[query] = cleanup_text(response)
+
+            passages = [(f"Q: {cleanup_text(query)}\nA: ", response) for query, response in context_responses.items()]
+
+        # Combine the passages into one deduplicated context within the section's token budget
+        cleaned_context, context_stats = assemble_context(passages, CONTEXT_TOKEN_BUDGET, CONTEXT_DUPLICATE_THRESHOLD)
+        section_span.set(**context_stats)
+
+        # Process the final query using the cleaned context with the chat model
+        if queries:
+            final_query_text = queries[-1]  # Ensure there's at least one query
+            section_on_token = (lambda delta: on_token(section, delta)) if on_token is not None else None
+            final_response = await aformulate_chat_query(llm, cleaned_context, final_query_text, on_token=section_on_token, priority=priority)
+            final_response = cleanup_text(final_response)  # Apply cleanup to the final response
+
+        if cache_path is not None and not failed_subqueries:
+            save_section(cache_path, section, final_response)
+        return section, final_response
+
+def load_or_build_index(file_path: Path, doc_hash: str, file_bytes: Optional[bytes] = None) -> Tuple[ServiceContext, VectorStoreIndex]:
+    """
+    Reuse the parsed and embedded document if it has been indexed before, otherwise build and persist it.
+    """
+    from llama_index import ServiceContext
+
+    from trace_handler import get_callback_manager
+
+    llm, embed_model = get_llm(), get_embed_model()
+    index_dir = os.path.join(INDEX_CACHE_DIR, f"{doc_hash}-{index_fingerprint(embed_model)[:16]}")
+    service_context = ServiceContext.from_defaults(llm=llm, embed_model=embed_model, callback_manager=get_callback_manager())
+    with span("load_index") as load_span:
+        vector_store_index = load_index(index_dir, service_context)
+        load_span.set(found=vector_store_index is not None)
+    if vector_store_index is None:
+        # Embedding requests are traced as child spans; parse_seconds is the time spent producing node batches
+        with span("build_index") as build_span:
+            leaf_node_batches = timed(process_documents(file_path, file_bytes), build_span, "parse_seconds")
+            service_context, storage_context, vector_store_index = create_service_and_storage_contexts(llm, embed_model, leaf_node_batches)
+        with span("save_index"):
+            save_index(index_dir, storage_context)
+    return service_context, vector_store_index
+
+async def agenerate_summary(
+    file_path: str,
+    file_bytes: Optional[bytes] = None,
+    on_section: Optional[Callable[[str, str], None]] = None,
+    on_token: Optional[Callable[[str, str], None]] = None
+) -> str:
+    """
+    Generate the Key Information summary for a document. Pass file_bytes to summarize an in-memory
+    upload, in which case file_path only supplies the file name and type.
+
+    Progress callbacks run on the shared event loop thread: on_section(section, text) as each section
+    is finished, and on_token(section, delta) as each section's final answer is streamed.
+
+    Sections not finished within DOCUMENT_DEADLINE_SECONDS of the start, or that failed, are
+    replaced by a note naming them (see missing_sections), and such partial summaries are not cached.
+    The deadline bounds what the user waits for, so it counts from the call, including the time
+    spent parsing, embedding and prefetching retrieval.
+    """
+    started_at = time.monotonic()
     file_path = Path(file_path)
-    leaf_nodes = process_documents(file_path)
-    service_context, storage_context, vector_store_index = create_service_and_storage_contexts(llm, embed_model, leaf_nodes)
-    query_engine = setup_query_engine(service_context, vector_store_index)
-
-    final_responses: Dict[str, str] = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(messages_dict)) as executor:
-        future_to_section = {executor.submit(process_section, section, queries, query_engine, llm): section for section, queries in messages_dict.items()}
-        for future in concurrent.futures.as_completed(future_to_section):
-            section = future_to_section[future]
-            try:
-                section, response = future.result()
+    async with trace("generate_summary", document=file_path.name) as summary_trace:
+        if file_bytes is None:
+            file_bytes = file_path.read_bytes()
+        doc_hash = document_hash(file_bytes)
+        llm, embed_model = get_llm(), get_embed_model()
+        summary_trace.attributes["document_hash"] = doc_hash
+        # From the first summary on, cache entries past their age or size bound are deleted every few minutes
+        start_pruning()
+
+        # A repeat upload with unchanged prompts and models is answered from the summary cache
+        summary_path = os.path.join(SUMMARY_CACHE_DIR, f"{doc_hash}-{summary_fingerprint(llm, embed_model)[:16]}.json")
+        cached_summary = load_summary(summary_path)
+        summary_trace.attributes["cached"] = cached_summary is not None
+        if cached_summary is not None:
+            return cached_summary
+
+        # Parsing and embedding are blocking, so keep them off the shared event loop
+        service_context, vector_store_index = await asyncio.to_thread(load_or_build_index, file_path, doc_hash, file_bytes)
+        query_engine = setup_query_engine(service_context, vector_store_index)
+
+        # Embed and rank every sub-query up front in one batch; sections then retrieve from the precomputed results
+        subqueries = [query for queries in messages_dict.values() for query in queries[:-1]]
+        with span("prefetch_retrieval", queries=len(subqueries)):
+            await get_batch_retriever(query_engine).aretrieve_batch(subqueries)
+
+        # Fixed sections are available immediately
+        if on_section is not None:
+            for key, value in PREDEFINED_ENTRIES.items():
+                if key not in messages_dict:
+                    on_section(key, value)
+
+        # Sections whose retrieved text matches an earlier run (such as a previous revision of this document) are reused
+        settings = pipeline_settings(llm, embed_model)
+
+        async def run_section(section: str, priority: int) -> Tuple[str, str]:
+            queries = messages_dict[section]
+            cache_path = await asection_cache_path(section, queries, query_engine.retriever, settings) if REUSE_SECTIONS else None
+            result = await aprocess_section(section, queries, query_engine, llm, on_token=on_token, cache_path=cache_path, priority=priority)
+            if on_section is not None:
+                on_section(*result)
+            return result
+
+        # Every call of a section goes ahead of those of the sections after it in the summary, so
+        # sections finish one after another from the top instead of all advancing together, and a
+        # summary cut short by the deadline is missing only its last sections
+        tasks = {section: asyncio.ensure_future(run_section(section, priority)) for priority, section in enumerate(messages_dict)}
+        remaining = DOCUMENT_DEADLINE_SECONDS - (time.monotonic() - started_at) if DOCUMENT_DEADLINE_SECONDS else None
+        try:
+            _, late = await asyncio.wait(tasks.values(), timeout=max(remaining, 0) if remaining is not None else None)
+        except asyncio.CancelledError:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        for task in late:
+            task.cancel()
+        await asyncio.gather(*late, return_exceptions=True)
+
+        final_responses: Dict[str, str] = {}
+        missing: Dict[str, str] = {}
+        for section, task in tasks.items():
+            if task in late:
+                missing[section] = "not finished before the deadline"
+                metrics.inc("ki_sections_missing_total", reason="deadline")
+            elif task.exception() is not None:
+                missing[section] = "generation failed"
+                metrics.inc("ki_sections_missing_total", reason="error")
+                record_exception("section_failed", task.exception(), section=section)
+            else:
+                section, response = task.result()
                 final_responses[section] = response
-            except Exception as exc:
-                print(f'{section} generated an exception: {exc}')
-    
-    # Safely insert new predefined entries without overwriting existing ones
-    predefined_entries = {
-        "section2": "A research study is different from the regular medical care you receive from your doctor. Research studies hope to make discoveries and learn new information about diseases and how to treat them. You should consider the reasons why you might want to join a research study or why it is not the best decision for you at this time.",
-        "section3": "Research studies do not always offer the possibility of treating your disease or condition. Research studies also have different kinds of risks and risk levels, depending on the type of the study. You may also need to think about other requirements for being in the study. For example, some studies require you to travel to scheduled visits at the study site in Ann Arbor or elsewhere. This may require you to arrange travel, change work schedules, find child care, or make other plans. In your decision to participate in this study, consider all of these matters carefully."
-    }
-    for key, value in predefined_entries.items():
-        if key not in final_responses:  # Ensure not to overwrite processed responses
-            final_responses[key] = value
+        summary_trace.attributes["missing_sections"] = sorted(missing)
+        for section, reason in missing.items():
+            final_responses[section] = missing_section_note(section, reason)
+            if on_section is not None:
+                on_section(section, final_responses[section])
+
+        # Safely insert new predefined entries without overwriting existing ones
+        for key, value in PREDEFINED_ENTRIES.items():
+            if key not in final_responses:  # Ensure not to overwrite processed responses
+                final_responses[key] = value
 
-    # Remove sections that are empty, null, only a space, or only a quoted space
-    final_responses = remove_empty_sections(final_responses)
+        # Remove sections that are empty, null, only a space, or only a quoted space
+        final_responses = remove_empty_sections(final_responses)
 
-    # Concatenate final responses into a single string separated by two newlines
-    combined_responses = "\n\n".join(final_responses[section] for section in sorted(final_responses))
-    return combined_responses
+        # Concatenate final responses into a single string separated by two newlines
+        combined_responses = "\n\n".join(final_responses[section] for section in sorted(final_responses))
+
+        # Only complete summaries are cached, so a transient failure is retried on the next request
+        if not missing:
+            save_summary(summary_path, combined_responses)
+        return combined_responses
+
+def generate_summary(file_path: str, file_bytes: Optional[bytes] = None) -> str:
+    """
+    Blocking entry point. Summaries from every caller share one event loop and one set of rate limits.
+    """
+    return run_on_loop(agenerate_summary(file_path, file_bytes))
 
 if __name__ == "__main__":
-    if len(argv) > 1:
-        print(generate_summary(argv[1]))
+    parser = argparse.ArgumentParser(description="Generate the Key Information section of informed consent documents.")
+    parser.add_argument("document", nargs="?", help="Consent document (.pdf or .docx); the summary is printed.")
+    parser.add_argument("--batch", metavar="DIR_OR_GLOB", help="Summarize every .pdf and .docx in a directory or matching a glob.")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL results file for --batch; also the resume checkpoint.")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Documents in flight at once with --batch.")
+    args = parser.parse_args()
+
+    if args.batch:
+        from batch_summary import run_batch
+
+        counts = run_batch(args.batch, args.output, agenerate_summary, args.concurrency)
+        print(json.dumps(counts))
+        raise SystemExit(1 if counts["error"] or counts["partial"] else 0)
+    elif args.document:
+        print(generate_summary(args.document))
+    else:
+        parser.print_help()
@@ -0,0 +1,259 @@
+"""
+Compact in-memory vector store backed by one contiguous NumPy array.
+
+llama-index's SimpleVectorStore keeps every embedding as a Python list of floats, about 32 bytes
+per dimension. EmbeddingMatrix keeps unit-normalized rows in a single array instead:
+  - float32: 4 bytes per dimension, same scores as SimpleVectorStore
+  - float16: 2 bytes per dimension
+  - int8:    1 byte per dimension, plus one float32 scale per row (symmetric per-row quantization)
+Cosine similarity against every row is a blocked matrix product, so quantized rows are only
+widened to float32 one block at a time.
+
+NumpyVectorStore adapts the matrix to llama-index's VectorStore protocol and persists it as a
+single .npz file next to the docstore.
+"""
+
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.schema import BaseNode
+from llama_index.vector_stores.simple import DEFAULT_PERSIST_FNAME, DEFAULT_VECTOR_STORE, NAMESPACE_SEP
+from llama_index.vector_stores.types import VectorStoreQuery, VectorStoreQueryMode, VectorStoreQueryResult
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+# Rows widened to float32 at a time when scoring quantized embeddings
+SCORE_BLOCK_ROWS = 4096
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingMatrix:
+    """Unit-normalized embeddings stored contiguously, optionally quantized."""
+
+    def __init__(self, dtype: str = "float32", dimensions: Optional[int] = None) -> None:
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype {dtype!r}; expected one of {', '.join(VECTOR_DTYPES)}.")
+        self.dtype = dtype
+        self.dimensions = dimensions
+        self._rows = np.empty((0, dimensions or 0), dtype=np.dtype(dtype))
+        self._scales = np.empty(0, dtype=np.float32)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def rows(self) -> np.ndarray:
+        """The stored rows, without copying."""
+        return self._rows[: self._count]
+
+    @property
+    def scales(self) -> np.ndarray:
+        """Per-row scales of int8 rows (ones for floating-point dtypes)."""
+        return self._scales[: self._count]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + (self.scales.nbytes if self.dtype == "int8" else 0)
+
+    def _quantize(self, vectors: np.ndarray) -> tuple:
+        if self.dtype != "int8":
+            return vectors.astype(self.dtype), np.ones(len(vectors), dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def append(self, vectors: Sequence[Sequence[float]]) -> None:
+        """Normalize, quantize and append rows, growing the array geometrically."""
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+        if self.dimensions is None or self._rows.shape[1] == 0:
+            self.dimensions = vectors.shape[1]
+            self._rows = np.empty((0, self.dimensions), dtype=self._rows.dtype)
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions}-dimensional embeddings, got {vectors.shape[1]}.")
+        rows, scales = self._quantize(vectors)
+        needed = self._count + len(rows)
+        if needed > len(self._rows):
+            capacity = max(needed, 2 * len(self._rows), 64)
+            grown_rows = np.empty((capacity, self.dimensions), dtype=self._rows.dtype)
+            grown_rows[: self._count] = self.rows
+            grown_scales = np.empty(capacity, dtype=np.float32)
+            grown_scales[: self._count] = self.scales
+            self._rows, self._scales = grown_rows, grown_scales
+        self._rows[self._count:needed] = rows
+        self._scales[self._count:needed] = scales
+        self._count = needed
+
+    def keep(self, mask: np.ndarray) -> None:
+        """Drop every row whose mask entry is False."""
+        self._rows = np.ascontiguousarray(self.rows[mask])
+        self._scales = self.scales[mask].copy()
+        self._count = len(self._rows)
+
+    def shrink(self) -> None:
+        """Release spare capacity left by appends."""
+        if len(self._rows) != self._count:
+            self._rows = self.rows.copy()
+            self._scales = self.scales.copy()
+
+    def vector(self, row: int) -> np.ndarray:
+        """Return one row as float32."""
+        return self._rows[row].astype(np.float32) * self._scales[row]
+
+    def similarities(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query (rows of a 2-D array) against every stored row."""
+        queries = _normalize_rows(np.asarray(queries, dtype=np.float32).reshape(-1, self.dimensions or 0))
+        if self.dtype == "float32":
+            return queries @ self.rows.T
+        scores = np.empty((len(queries), self._count), dtype=np.float32)
+        for start in range(0, self._count, SCORE_BLOCK_ROWS):
+            block = self._rows[start:min(start + SCORE_BLOCK_ROWS, self._count)].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        if self.dtype == "int8":
+            scores *= self.scales
+        return scores
+
+    def save(self, file: Any, **arrays: np.ndarray) -> None:
+        np.savez(file, rows=self.rows, scales=self.scales, dtype=np.array(self.dtype), **arrays)
+
+    @classmethod
+    def from_arrays(cls, rows: np.ndarray, scales: np.ndarray, dtype: str) -> "EmbeddingMatrix":
+        matrix = cls(dtype=dtype, dimensions=rows.shape[1])
+        matrix._rows, matrix._scales, matrix._count = rows, scales, len(rows)
+        return matrix
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return, for each row of a score matrix, the column indices of its k highest scores in descending order."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class NumpyVectorStore:
+    """llama-index vector store over an EmbeddingMatrix; node text stays in the docstore."""
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+    flat_metadata: bool = True
+
+    def __init__(self, dtype: str = "float32", dimensions: Optional[int] = None) -> None:
+        self.embeddings = EmbeddingMatrix(dtype=dtype, dimensions=dimensions)
+        self.node_ids: List[str] = []
+        self._ref_doc_ids: List[Optional[str]] = []
+        self._rows_by_id: Dict[str, int] = {}
+
+    @property
+    def client(self) -> None:
+        return None
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes with embeddings; re-adding a node id replaces its previous embedding."""
+        if not nodes:
+            return []
+        replaced = {node.node_id for node in nodes} & self._rows_by_id.keys()
+        if replaced:
+            self._remove(lambda node_id, ref_doc_id: node_id in replaced)
+        self.embeddings.append([node.get_embedding() for node in nodes])
+        for node in nodes:
+            self._rows_by_id[node.node_id] = len(self.node_ids)
+            self.node_ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+        return [node.node_id for node in nodes]
+
+    async def async_add(self, nodes: List[BaseNode], **kwargs: Any) -> List[str]:
+        return self.add(nodes, **kwargs)
+
+    def _remove(self, should_remove) -> None:
+        mask = np.array([not should_remove(node_id, ref_doc_id) for node_id, ref_doc_id in zip(self.node_ids, self._ref_doc_ids)], dtype=bool)
+        self.embeddings.keep(mask)
+        self.node_ids = [node_id for node_id, keep in zip(self.node_ids, mask) if keep]
+        self._ref_doc_ids = [ref_doc_id for ref_doc_id, keep in zip(self._ref_doc_ids, mask) if keep]
+        self._rows_by_id = {node_id: row for row, node_id in enumerate(self.node_ids)}
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._remove(lambda node_id, node_ref_doc_id: node_ref_doc_id == ref_doc_id)
+
+    async def adelete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self.delete(ref_doc_id, **delete_kwargs)
+
+    def get(self, node_id: str) -> List[float]:
+        """Return a node's (dequantized, normalized) embedding."""
+        return self.embeddings.vector(self._rows_by_id[node_id]).tolist()
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"NumpyVectorStore only supports the default query mode, not {query.mode}.")
+        if query.filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters.")
+        if not self.node_ids or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+        scores = self.embeddings.similarities(np.asarray([query.query_embedding], dtype=np.float32))
+        if query.node_ids is not None or query.doc_ids is not None:
+            allowed = np.array([
+                (query.node_ids is None or node_id in query.node_ids) and (query.doc_ids is None or ref_doc_id in query.doc_ids)
+                for node_id, ref_doc_id in zip(self.node_ids, self._ref_doc_ids)
+            ], dtype=bool)
+            scores[:, ~allowed] = -np.inf
+        rows = [row for row in top_k_indices(scores, query.similarity_top_k)[0] if np.isfinite(scores[0, row])]
+        return VectorStoreQueryResult(
+            nodes=None, similarities=[float(scores[0, row]) for row in rows], ids=[self.node_ids[row] for row in rows]
+        )
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        return self.query(query, **kwargs)
+
+    @staticmethod
+    def npz_path(persist_path: str) -> str:
+        """StorageContext asks for <namespace>__vector_store.json; the arrays are saved beside it as .npz."""
+        return os.path.splitext(persist_path)[0] + ".npz"
+
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        if fs is not None:
+            raise ValueError("NumpyVectorStore only persists to the local filesystem.")
+        self.embeddings.shrink()
+        path = self.npz_path(persist_path)
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, staging_path = tempfile.mkstemp(dir=directory, prefix=".staging-", suffix=".npz")
+        with os.fdopen(fd, "wb") as file:
+            self.embeddings.save(
+                file,
+                node_ids=np.array(self.node_ids, dtype=str),
+                ref_doc_ids=np.array([ref_doc_id or "" for ref_doc_id in self._ref_doc_ids], dtype=str),
+            )
+        os.replace(staging_path, path)
+
+    @classmethod
+    def persist_path_in(cls, persist_dir: str, namespace: str = DEFAULT_VECTOR_STORE) -> str:
+        """The persist_path StorageContext.persist uses for a namespace's vector store."""
+        return os.path.join(persist_dir, f"{namespace}{NAMESPACE_SEP}{DEFAULT_PERSIST_FNAME}")
+
+    @classmethod
+    def exists_in(cls, persist_dir: str, namespace: str = DEFAULT_VECTOR_STORE) -> bool:
+        return os.path.exists(cls.npz_path(cls.persist_path_in(persist_dir, namespace)))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, namespace: str = DEFAULT_VECTOR_STORE) -> "NumpyVectorStore":
+        return cls.from_persist_path(cls.persist_path_in(persist_dir, namespace))
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str) -> "NumpyVectorStore":
+        with np.load(cls.npz_path(persist_path)) as arrays:
+            store = cls(dtype=str(arrays["dtype"]))
+            store.embeddings = EmbeddingMatrix.from_arrays(arrays["rows"], arrays["scales"], str(arrays["dtype"]))
+            store.node_ids = arrays["node_ids"].tolist()
+            store._ref_doc_ids = [ref_doc_id or None for ref_doc_id in arrays["ref_doc_ids"].tolist()]
+        store._rows_by_id = {node_id: row for row, node_id in enumerate(store.node_ids)}
+        return store
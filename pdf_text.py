@@ -0,0 +1,115 @@
+"""
+Page-level PDF text extraction helpers.
+
+This module only depends on pypdf so that process-pool workers start quickly. Pages are
+fingerprinted by their content streams and resource trees, which lets extracted text be cached per page
+and reused when a revised document keeps most of its pages unchanged.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+import pypdf
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+_worker_pdf: Optional[pypdf.PdfReader] = None
+
+
+def _hash_object(obj: Any, digest: Any, seen: Dict[Tuple[int, int], int]) -> None:
+    """
+    Feed a resolved PDF object into digest. Indirect references are followed rather than
+    stringified, since their repr names the parsing reader and differs between parses; one seen
+    before (shared fonts, or a cycle) is hashed as its first-visit position instead.
+    """
+    if isinstance(obj, IndirectObject):
+        reference = (obj.idnum, obj.generation)
+        if reference in seen:
+            digest.update(b"R%d;" % seen[reference])
+            return
+        seen[reference] = len(seen)
+        obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        digest.update(b"<%d" % len(obj))
+        for key in sorted(obj):
+            digest.update(b"/%d:%s" % (len(key), key.encode("utf-8", "surrogatepass")))
+            _hash_object(obj.raw_get(key), digest, seen)
+        digest.update(b">")
+        if isinstance(obj, StreamObject):
+            # extract_text never decodes image samples, so skip them rather than inflate every image
+            data = b"" if obj.get("/Subtype") == "/Image" else obj.get_data()
+            digest.update(b"S%d:" % len(data))
+            digest.update(data)
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[%d" % len(obj))
+        for item in obj:
+            _hash_object(item, digest, seen)
+        digest.update(b"]")
+    elif isinstance(obj, bytes):
+        digest.update(b"B%d:" % len(obj))
+        digest.update(bytes(obj))
+    else:
+        text = str(obj).encode("utf-8", "surrogatepass")
+        digest.update(b"%s%d:" % (type(obj).__name__.encode(), len(text)))
+        digest.update(text)
+
+
+def page_fingerprint(page: pypdf.PageObject) -> str:
+    """
+    Hash everything extract_text() depends on: the pypdf version, the page's rotation and content
+    stream, and its whole resource tree, including fonts, encodings, ToUnicode maps and the
+    content and resources of form XObjects.
+    """
+    digest = hashlib.sha256(pypdf.__version__.encode())
+    seen: Dict[Tuple[int, int], int] = {}
+    _hash_object(page.get("/Rotate", 0), digest, seen)
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    digest.update(b"C%d:" % len(data))
+    digest.update(data)
+    _hash_object(page.raw_get("/Resources") if "/Resources" in page else None, digest, seen)
+    return digest.hexdigest()
+
+
+def init_worker(data: bytes) -> None:
+    """Process-pool initializer: parse the PDF once per worker instead of once per page."""
+    global _worker_pdf
+    _worker_pdf = pypdf.PdfReader(io.BytesIO(data))
+
+
+def extract_page(page_number: int) -> Tuple[int, str]:
+    """Extract one page's text inside a worker started with init_worker."""
+    return page_number, _worker_pdf.pages[page_number].extract_text()
+
+
+class PageTextCache:
+    """Directory of extracted page texts, one file per page fingerprint."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"{fingerprint}.txt")
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        try:
+            with open(self._path(fingerprint), "r", encoding="utf-8", errors="surrogatepass") as file:
+                text = file.read()
+        except FileNotFoundError:
+            return None
+        # The modification time marks the last use, for result_cache.prune_caches
+        try:
+            os.utime(self._path(fingerprint))
+        except OSError:
+            pass
+        return text
+
+    def put(self, fingerprint: str, text: str) -> None:
+        # Write to a temporary file first so concurrent readers never see a partial page
+        fd, staging_path = tempfile.mkstemp(dir=self.directory, prefix=".staging-", suffix=".txt")
+        with os.fdopen(fd, "w", encoding="utf-8", errors="surrogatepass") as file:
+            file.write(text)
+        os.replace(staging_path, self._path(fingerprint))
@@ -0,0 +1,139 @@
+"""
+Node rerankers for the sub-query engine.
+
+"llm" is llama-index's LLMRerank, which asks a chat model to score every candidate. "local"
+fuses BM25 keyword scores with the retriever's embedding similarities on the CPU and makes no
+network calls. "none" keeps the retriever's order.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from llama_index import ServiceContext
+from llama_index.bridge.pydantic import Field, PrivateAttr
+from llama_index.callbacks import CallbackManager
+from llama_index.postprocessor import LLMRerank
+from llama_index.postprocessor.types import BaseNodePostprocessor
+from llama_index.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle
+
+RERANKERS = ("llm", "local", "none")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it me my of on or that the "
+    "this to was what when which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without common stopwords."""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in _STOPWORDS]
+
+
+def _min_max(scores: Sequence[float]) -> List[float]:
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [0.0 for _ in scores]
+    return [(score - low) / (high - low) for score in scores]
+
+
+class LocalRerank(BaseNodePostprocessor):
+    """Reranks candidates by a weighted fusion of BM25 and embedding similarity, without any API calls."""
+
+    top_n: int = Field(default=4, description="Top N nodes to return.")
+    bm25_weight: float = Field(default=0.5, description="Weight of the BM25 score; the embedding similarity gets the rest.")
+    k1: float = Field(default=1.5, description="BM25 term-frequency saturation.")
+    b: float = Field(default=0.75, description="BM25 length normalization.")
+
+    _document_frequencies: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _document_count: int = PrivateAttr(default=0)
+    _average_length: float = PrivateAttr(default=0.0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalRerank"
+
+    @classmethod
+    def from_nodes(cls, nodes: Sequence[BaseNode], top_n: int = 4, **kwargs: float) -> "LocalRerank":
+        """Create a reranker whose BM25 statistics come from the whole document rather than only the candidates."""
+        reranker = cls(top_n=top_n, **kwargs)
+        reranker.fit([node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes])
+        return reranker
+
+    def fit(self, texts: Sequence[str]) -> None:
+        """Compute document frequencies and the average length over a corpus of chunk texts."""
+        frequencies: Counter = Counter()
+        total_length = 0
+        for text in texts:
+            tokens = tokenize(text)
+            total_length += len(tokens)
+            frequencies.update(set(tokens))
+        self._document_frequencies = dict(frequencies)
+        self._document_count = len(texts)
+        self._average_length = total_length / len(texts) if texts else 0.0
+
+    def _bm25_scores(self, query: str, texts: List[str]) -> List[float]:
+        documents = [tokenize(text) for text in texts]
+        if self._document_count:
+            frequencies, count, average_length = self._document_frequencies, self._document_count, self._average_length
+        else:
+            frequencies = Counter(token for document in documents for token in set(document))
+            count = len(documents)
+            average_length = sum(len(document) for document in documents) / count
+        average_length = average_length or 1.0
+
+        scores = []
+        query_terms = set(tokenize(query))
+        for document in documents:
+            term_counts = Counter(document)
+            score = 0.0
+            for term in query_terms:
+                term_count = term_counts.get(term, 0)
+                if not term_count:
+                    continue
+                frequency = frequencies.get(term, 0)
+                idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+                length_norm = self.k1 * (1 - self.b + self.b * len(document) / average_length)
+                score += idf * term_count * (self.k1 + 1) / (term_count + length_norm)
+            scores.append(score)
+        return scores
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("Query bundle must be provided.")
+        if len(nodes) == 0:
+            return []
+
+        texts = [node.node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes]
+        bm25 = _min_max(self._bm25_scores(query_bundle.query_str, texts))
+        similarity = _min_max([node.score or 0.0 for node in nodes])
+        fused = [self.bm25_weight * keyword + (1 - self.bm25_weight) * semantic for keyword, semantic in zip(bm25, similarity)]
+
+        # Ties keep the retriever's order
+        ranked = sorted(range(len(nodes)), key=lambda index: -fused[index])
+        return [NodeWithScore(node=nodes[index].node, score=fused[index]) for index in ranked[: self.top_n]]
+
+
+def get_reranker(
+    name: str, top_n: int, nodes: Sequence[BaseNode] = (), callback_manager: Optional[CallbackManager] = None
+) -> Optional[BaseNodePostprocessor]:
+    """
+    Build the configured reranker; nodes supply corpus statistics for the local backend, and
+    callback_manager receives the LLM reranker's events.
+    """
+    if name == "llm":
+        from clients import get_embed_model, get_rerank_llm
+
+        # LLMRerank never embeds, but ServiceContext would otherwise build a default embedding model
+        service_context = ServiceContext.from_defaults(llm=get_rerank_llm(), embed_model=get_embed_model(), callback_manager=callback_manager)
+        return LLMRerank(top_n=top_n, service_context=service_context)
+    if name == "local":
+        return LocalRerank.from_nodes(nodes, top_n=top_n)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown reranker {name!r}; expected one of {', '.join(RERANKERS)}.")
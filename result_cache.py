@@ -0,0 +1,219 @@
+"""
+Reuse of earlier work: persisted vector indexes, finished summaries and section outputs.
+
+Indexes are stored per document (SHA-256 of the uploaded bytes) so that a prompt change can
+reuse the parsed and embedded document. Summaries are stored per document and per pipeline
+fingerprint, so a repeat upload with unchanged prompts and models is answered from disk. Section
+outputs are stored per hash of everything the section's answer depends on, so a revised document
+only regenerates the sections whose retrieved text changed.
+
+Every entry's modification time is its last use. prune_caches deletes entries older than
+RESULT_CACHE_MAX_AGE_SECONDS and the least recently used ones beyond RESULT_CACHE_MAX_BYTES, in
+these caches, the page text cache and the trace directory; start_pruning runs it every
+PRUNE_INTERVAL_SECONDS for as long as the process lives.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+
+from config import INDEX_CACHE_DIR, PAGE_CACHE_DIR, RESULT_CACHE_MAX_AGE_SECONDS, RESULT_CACHE_MAX_BYTES, SECTION_CACHE_DIR, SUMMARY_CACHE_DIR, TRACE_DIR
+from tracing import metrics
+
+if TYPE_CHECKING:
+    from llama_index import ServiceContext, StorageContext, VectorStoreIndex
+
+# A pass lists and stats every entry, so each process prunes this often
+PRUNE_INTERVAL_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+_pruning_task: Optional[asyncio.Task] = None
+
+
+def document_hash(data: bytes) -> str:
+    """Return the SHA-256 of a document's raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Return the SHA-256 of a file, read in blocks so it is never held in memory whole."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def touch(path: str) -> None:
+    """Mark a cache entry as just used, so pruning keeps it longest."""
+    try:
+        os.utime(path)
+    except OSError:
+        # Pruned by another session in the meantime
+        pass
+
+
+def _entry_usage(path: str) -> Tuple[float, int]:
+    if os.path.isdir(path):
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    else:
+        size = os.path.getsize(path)
+    return os.path.getmtime(path), size
+
+
+def prune_cache(directory: str, max_bytes: int, max_age_seconds: float) -> int:
+    """
+    Delete the entries (files or directories) of a cache directory that were last used more than
+    max_age_seconds ago, then the least recently used ones until the rest fit in max_bytes. 0
+    disables either limit. Returns how many entries were deleted.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    now = time.time()
+    entries: List[Tuple[str, float, int]] = []
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            used, size = _entry_usage(path)
+        except OSError:
+            continue
+        # Staging entries are being written, unless a crash left them behind long ago
+        if name.startswith(".staging-") and not (max_age_seconds and now - used > max_age_seconds):
+            continue
+        entries.append((path, used, size))
+    entries.sort(key=lambda entry: entry[1], reverse=True)
+    kept_bytes = deleted = 0
+    for path, used, size in entries:
+        if (max_age_seconds and now - used > max_age_seconds) or (max_bytes and kept_bytes + size > max_bytes):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            deleted += 1
+        else:
+            kept_bytes += size
+    return deleted
+
+
+def prune_caches() -> None:
+    """Prune the index, summary, section and page caches and the traces."""
+    for cache, directory in (("index", INDEX_CACHE_DIR), ("summary", SUMMARY_CACHE_DIR), ("section", SECTION_CACHE_DIR), ("page", PAGE_CACHE_DIR), ("trace", TRACE_DIR)):
+        if not directory:
+            continue
+        deleted = prune_cache(directory, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_AGE_SECONDS)
+        if deleted:
+            metrics.inc("ki_cache_pruned_total", deleted, cache=cache)
+
+
+async def _prune_periodically() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(prune_caches)
+        except OSError:
+            logger.exception("Could not prune the caches")
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+
+def start_pruning() -> None:
+    """
+    Prune the caches now and then every PRUNE_INTERVAL_SECONDS in the background of the running
+    event loop, so entries are deleted once they expire rather than when the next document arrives.
+    Does nothing if pruning already runs on this loop.
+    """
+    global _pruning_task
+    loop = asyncio.get_running_loop()
+    if _pruning_task is None or _pruning_task.done() or _pruning_task.get_loop() is not loop:
+        _pruning_task = loop.create_task(_prune_periodically())
+
+
+def fingerprint(settings: Any) -> str:
+    """Return a stable hash of JSON-serializable settings."""
+    canonical = json.dumps(settings, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def load_index(index_dir: str, service_context: ServiceContext) -> Optional[VectorStoreIndex]:
+    """Load a previously persisted index, or return None if there isn't one."""
+    if not os.path.isdir(index_dir):
+        return None
+    touch(index_dir)
+    from llama_index import StorageContext, load_index_from_storage
+
+    from numpy_vector_store import NumpyVectorStore
+
+    if NumpyVectorStore.exists_in(index_dir):
+        vector_store = NumpyVectorStore.from_persist_dir(index_dir)
+        storage_context = StorageContext.from_defaults(persist_dir=index_dir, vector_store=vector_store)
+    else:
+        storage_context = StorageContext.from_defaults(persist_dir=index_dir)
+    return load_index_from_storage(storage_context, service_context=service_context)
+
+
+def save_index(index_dir: str, storage_context: StorageContext) -> None:
+    """Persist an index's docstore and vector store, publishing the directory atomically."""
+    parent = os.path.dirname(index_dir)
+    os.makedirs(parent, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=parent, prefix=".staging-")
+    try:
+        storage_context.persist(persist_dir=staging_dir)
+        os.replace(staging_dir, index_dir)
+    except OSError:
+        # Another session published the same document first; its copy is equivalent
+        if not os.path.isdir(index_dir):
+            raise
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _load_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            payload = json.load(file)
+    except FileNotFoundError:
+        return None
+    touch(path)
+    return payload
+
+
+def _save_json(path: str, payload: Any) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, staging_path = tempfile.mkstemp(dir=directory, prefix=".staging-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(payload, file, ensure_ascii=False)
+    os.replace(staging_path, path)
+
+
+def load_summary(summary_path: str) -> Optional[str]:
+    """Return a cached summary, or None if it hasn't been generated yet."""
+    cached = _load_json(summary_path)
+    return cached["summary"] if cached is not None else None
+
+
+def save_summary(summary_path: str, summary: str) -> None:
+    """Write a summary to the cache, replacing the file atomically."""
+    _save_json(summary_path, {"summary": summary})
+
+
+def load_section(section_path: str) -> Optional[str]:
+    """Return a cached section output, or None if these inputs haven't been answered yet."""
+    cached = _load_json(section_path)
+    return cached["response"] if cached is not None else None
+
+
+def save_section(section_path: str, section: str, response: str) -> None:
+    """Write a section output to the cache, replacing the file atomically."""
+    _save_json(section_path, {"section": section, "response": response})
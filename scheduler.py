@@ -0,0 +1,356 @@
+"""
+Process-wide scheduling of OpenAI calls.
+
+Every summary runs on one background event loop, so a single concurrency limit and one
+requests/tokens-per-minute budget per model are shared by all Streamlit sessions and CLI jobs
+in the process. Calls rejected with HTTP 429 are retried with jittered exponential backoff,
+and the model's budget is paused so that concurrent callers back off together. Attempts that
+exceed CALL_TIMEOUT_SECONDS are retried, and an attempt still running past the HEDGE_PERCENTILE
+of its stage's recent latencies is duplicated under the same limits; the first answer is used.
+Streamed calls are instead timed chunk by chunk, and are not retried once text has been shown.
+Callers waiting for budget or a slot are served lowest priority value first, then in arrival
+order, so a summary's first sections are not held back by calls for its later ones.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Coroutine, Dict, List, Optional, Tuple, TypeVar
+
+from config import CALL_TIMEOUT_SECONDS, HEDGE_PERCENTILE, MAX_CONCURRENT_REQUESTS, MAX_RETRIES, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE
+from tracing import Span, metrics, span
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+_semaphore: Optional["PrioritySemaphore"] = None
+_rate_limiters: Dict[str, "RateLimiter"] = {}
+_rate_limits: Dict[str, Tuple[int, int]] = {}
+_latencies: Dict[str, "LatencyWindow"] = {}
+
+if TYPE_CHECKING:
+    import openai
+
+
+class StreamInterrupted(Exception):
+    """A streamed response stalled after part of it had been delivered."""
+
+
+class PrioritySemaphore:
+    """A semaphore whose waiters get slots lowest priority value first, then in arrival order."""
+
+    def __init__(self, value: int) -> None:
+        self._value = value
+        self._waiters: List[list] = []
+        self._arrivals = itertools.count()
+
+    async def acquire(self, priority: int = 0) -> None:
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        granted = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._arrivals), granted])
+        try:
+            await granted
+        except asyncio.CancelledError:
+            # A cancelled waiter stays in the heap and is skipped by release(), unless it had
+            # already been handed the slot, which then goes to the next waiter
+            if granted.done() and not granted.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            granted = heapq.heappop(self._waiters)[2]
+            if not granted.done():
+                granted.set_result(None)
+                return
+        self._value += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class RateLimiter:
+    """Token buckets for one model's requests-per-minute and tokens-per-minute limits."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int) -> None:
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Waiters are served by priority, then in arrival order so large requests are not starved by small ones
+        self._lock = PrioritySemaphore(1)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int, requests: int = 1, priority: int = 0) -> None:
+        """Wait until the budget allows the given number of requests and tokens, then spend it."""
+        tokens = min(tokens, self.tokens_per_minute)
+        requests = min(requests, self.requests_per_minute)
+        async with self._lock.slot(priority):
+            while True:
+                self._refill()
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0:
+                    if self._requests >= requests and self._tokens >= tokens:
+                        self._requests -= requests
+                        self._tokens -= tokens
+                        return
+                    wait = max(
+                        (requests - self._requests) * 60 / self.requests_per_minute,
+                        (tokens - self._tokens) * 60 / self.tokens_per_minute,
+                    )
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out budget for a while, e.g. after the server answered with 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class LatencyWindow:
+    """Latencies of one stage's most recent calls."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20) -> None:
+        self._samples: deque = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """The given percentile of recent latencies, or None until there are enough samples."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared event loop, starting its thread on first use."""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            # Blocking OpenAI calls run in to_thread workers while holding a concurrency slot; the
+            # default pool (cpu_count + 4 threads) could hold fewer calls than there are slots and
+            # would queue the rest first in, first out, ahead of their priority
+            _loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENT_REQUESTS + min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="ki-summary-worker"
+            ))
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="ki-summary-loop", daemon=True)
+            _loop_thread.start()
+    return _loop
+
+
+def submit(coro: Coroutine[None, None, T]) -> "concurrent.futures.Future[T]":
+    """Schedule a coroutine on the shared event loop and return a thread-safe future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro: Coroutine[None, None, T]) -> T:
+    """Run a coroutine on the shared event loop and block the calling thread until it finishes."""
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run() would block the shared event loop; await the coroutine instead.")
+    return submit(coro).result()
+
+
+def set_rate_limits(model: str, requests_per_minute: int, tokens_per_minute: int) -> None:
+    """Give a model its own budget instead of REQUESTS_PER_MINUTE and TOKENS_PER_MINUTE; call before its first request."""
+    _rate_limits[model] = (requests_per_minute, tokens_per_minute)
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Return the process-wide rate limiter for a model."""
+    if model not in _rate_limiters:
+        _rate_limiters[model] = RateLimiter(*_rate_limits.get(model, (REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)))
+    return _rate_limiters[model]
+
+
+def _get_semaphore() -> PrioritySemaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = PrioritySemaphore(MAX_CONCURRENT_REQUESTS)
+    return _semaphore
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the same tokenizer llama-index uses for prompt sizing."""
+    from llama_index.utils import get_tokenizer
+
+    return len(get_tokenizer()(text))
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None, base: float = 1.0, cap: float = 60.0) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _retry_after(exc: openai.RateLimitError) -> Optional[float]:
+    try:
+        return float(exc.response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+async def _limited_call(
+    model: str,
+    estimated_tokens: int,
+    make_call: Callable[[], Awaitable[T]],
+    requests: int,
+    call_span: Span,
+    latencies: LatencyWindow,
+    started: asyncio.Event,
+    timeout: Optional[float],
+    priority: int,
+) -> T:
+    # One attempt: wait for budget and a concurrency slot, then call with a timeout
+    queued_at = time.perf_counter()
+    await get_rate_limiter(model).acquire(estimated_tokens, requests, priority)
+    async with _get_semaphore().slot(priority):
+        queue_wait = time.perf_counter() - queued_at
+        call_span.add(queue_wait_seconds=queue_wait)
+        metrics.observe("ki_openai_queue_wait_seconds", queue_wait, model=model)
+        started.set()
+        call_started = time.perf_counter()
+        result = await asyncio.wait_for(make_call(), timeout)
+        latencies.add(time.perf_counter() - call_started)
+        return result
+
+
+async def _hedged_call(
+    model: str,
+    estimated_tokens: int,
+    make_call: Callable[[], Awaitable[T]],
+    requests: int,
+    stage: str,
+    call_span: Span,
+    stream: bool,
+    priority: int,
+) -> T:
+    latencies = _latencies.setdefault(stage, LatencyWindow())
+    hedge_after = latencies.percentile(HEDGE_PERCENTILE) if not stream and HEDGE_PERCENTILE else None
+    # A stream's chunks are timed one by one with stream_chunks instead; its total length is unbounded
+    timeout = None if stream else CALL_TIMEOUT_SECONDS or None
+    started = asyncio.Event()
+    attempts: List[asyncio.Future] = [
+        asyncio.ensure_future(_limited_call(model, estimated_tokens, make_call, requests, call_span, latencies, started, timeout, priority))
+    ]
+    try:
+        if hedge_after is not None:
+            # Time the primary from when it gets a slot, so calls that are only queued are never hedged
+            waiting = asyncio.ensure_future(started.wait())
+            await asyncio.wait([attempts[0], waiting], return_when=asyncio.FIRST_COMPLETED)
+            waiting.cancel()
+            if not attempts[0].done():
+                done, _ = await asyncio.wait([attempts[0]], timeout=hedge_after)
+                if not done:
+                    call_span.add(hedged=1)
+                    metrics.inc("ki_openai_hedged_total", model=model, stage=stage)
+                    attempts.append(asyncio.ensure_future(
+                        _limited_call(model, estimated_tokens, make_call, requests, call_span, latencies, asyncio.Event(), timeout, priority)
+                    ))
+        pending = set(attempts)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt.result()
+                first_error = first_error or attempt.exception()
+        raise first_error
+    finally:
+        # Calls running in worker threads finish in the background, bounded by the client timeout
+        for attempt in attempts:
+            attempt.cancel()
+
+
+async def call_with_limits(
+    model: str,
+    estimated_tokens: int,
+    make_call: Callable[[], Awaitable[T]],
+    requests: int = 1,
+    stage: str = "call",
+    stream: bool = False,
+    priority: int = 0,
+) -> T:
+    """
+    Run an OpenAI call under the shared concurrency limit and the model's rate limits,
+    retrying 429 responses with jittered backoff and timed-out attempts right away. A slow
+    attempt is duplicated, unless stream is True: a streamed answer's tokens must arrive once, and
+    make_call bounds the wait for each chunk with stream_chunks rather than the whole call, raising
+    StreamInterrupted, which is not retried, if it stalls after showing text. Calls with a lower
+    priority value get budget and slots first. The call is traced as an "openai_call" span
+    recording its queue wait, retries and hedges; stage says what the call is for.
+    """
+    import openai
+
+    limiter = get_rate_limiter(model)
+    attempt = 0
+    with span("openai_call", stage=stage, model=model, estimated_tokens=estimated_tokens) as call_span:
+        while True:
+            try:
+                result = await _hedged_call(model, estimated_tokens, make_call, requests, stage, call_span, stream, priority)
+                metrics.inc("ki_openai_calls_total", model=model, stage=stage, outcome="ok")
+                return result
+            except openai.RateLimitError as exc:
+                if attempt >= MAX_RETRIES:
+                    metrics.inc("ki_openai_calls_total", model=model, stage=stage, outcome="rate_limited")
+                    raise
+                metrics.inc("ki_openai_retries_total", model=model, stage=stage)
+                call_span.add(retries=1)
+                # The next acquire() waits out the pause along with every other caller of this model
+                limiter.pause(backoff_delay(attempt, _retry_after(exc)))
+            except (asyncio.TimeoutError, openai.APITimeoutError):
+                if attempt >= MAX_RETRIES:
+                    metrics.inc("ki_openai_calls_total", model=model, stage=stage, outcome="timeout")
+                    raise
+                metrics.inc("ki_openai_retries_total", model=model, stage=stage)
+                call_span.add(retries=1, timeouts=1)
+            except StreamInterrupted:
+                metrics.inc("ki_openai_calls_total", model=model, stage=stage, outcome="timeout")
+                raise
+            except Exception:
+                metrics.inc("ki_openai_calls_total", model=model, stage=stage, outcome="error")
+                raise
+            attempt += 1
+
+
+async def stream_chunks(chunks: AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Yield the chunks of a streamed response, raising asyncio.TimeoutError when the first or any
+    next chunk takes longer than CALL_TIMEOUT_SECONDS to arrive.
+    """
+    while True:
+        try:
+            chunk = await asyncio.wait_for(chunks.__anext__(), CALL_TIMEOUT_SECONDS or None)
+        except StopAsyncIteration:
+            return
+        yield chunk
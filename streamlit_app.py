@@ -1,22 +1,102 @@
 import streamlit as st
 import os
 import base64
-from generate_ki_summary import generate_summary
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional
 
 st.set_page_config(page_title="Prototype AI Key Information Summary Generator", layout="wide")
 
 # Constants
 SUPPORTED_FILETYPES = {'.pdf', '.docx'}
-UPLOADS_DIR = "uploads"
+POLL_INTERVAL_SECONDS = 0.25
+# Finished jobs are kept this long so reruns and other sessions can still show their result
+FINISHED_JOB_TTL_SECONDS = 3600
+
+class SummaryJob:
+    """A summary generation running on the shared event loop, independent of Streamlit reruns."""
+
+    def __init__(self, file_name: str, file_bytes: bytes):
+        self.file_name = file_name
+        self.sections: Dict[str, str] = {}
+        self.partial_sections: Dict[str, str] = {}
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        pipeline = load_pipeline()
+        from scheduler import submit
+
+        self.future: Future = submit(
+            pipeline.agenerate_summary(file_name, file_bytes, on_section=self._on_section, on_token=self._on_token)
+        )
+        self.future.add_done_callback(self._on_done)
+
+    def _on_section(self, section: str, text: str):
+        with self._lock:
+            self.sections[section] = text
+            self.partial_sections.pop(section, None)
+
+    def _on_token(self, section: str, delta: str):
+        with self._lock:
+            self.partial_sections[section] = self.partial_sections.get(section, "") + delta
+
+    def _on_done(self, future: Future):
+        self.finished_at = time.monotonic()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def snapshot(self) -> Dict[str, str]:
+        """Finished sections plus the streamed text of sections still being written, in section order."""
+        with self._lock:
+            merged = {**self.partial_sections, **self.sections}
+        return {section: merged[section] for section in sorted(merged)}
+
+@st.cache_resource(show_spinner="Loading the summary pipeline...")
+def load_pipeline():
+    """Import the summary pipeline and build its LLM and embedding clients once per server process."""
+    import generate_ki_summary
+
+    generate_ki_summary.get_llm()
+    generate_ki_summary.get_embed_model()
+    return generate_ki_summary
+
+@st.cache_resource
+def get_job_registry() -> Dict[str, SummaryJob]:
+    """Running and recently finished jobs by document hash, shared by every session."""
+    return {}
+
+@st.cache_resource
+def start_cache_pruning() -> None:
+    """Delete expired cache entries from server start on, not only once a document is summarized."""
+    from result_cache import start_pruning
+    from scheduler import get_loop
+
+    get_loop().call_soon_threadsafe(start_pruning)
+
+def summary_job_key(file_bytes: bytes) -> str:
+    """Jobs are keyed by the uploaded document's content, not its file name."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def start_summary_job(file_name: str, file_bytes: bytes) -> str:
+    """Start generating a summary unless the same document is already in progress; return the job key."""
+    jobs = get_job_registry()
+    job_key = summary_job_key(file_bytes)
+    now = time.monotonic()
+    for key, job in list(jobs.items()):
+        if job.finished_at is not None and now - job.finished_at > FINISHED_JOB_TTL_SECONDS:
+            del jobs[key]
+    job = jobs.get(job_key)
+    if job is None or (job.done() and job.future.exception() is not None):
+        jobs[job_key] = SummaryJob(file_name, file_bytes)
+    return job_key
 
 def is_supported_filetype(filename: str) -> bool:
     """Check if the file type is supported."""
     return os.path.splitext(filename)[1] in SUPPORTED_FILETYPES
 
-def execute_script(document_path: str) -> str:
-    """Call the generate_summary function with the document path."""
-    return generate_summary(document_path)
-
+@st.cache_data
 def get_image_base64(path: str) -> str:
     with open(path, "rb") as image_file:
         encoded_string = base64.b64encode(image_file.read()).decode()
@@ -34,19 +114,34 @@ def create_header():
         """
     st.markdown(header_html, unsafe_allow_html=True)
 
+def cache_retention_note() -> str:
+    """Tell users how long their document and its output stay in the server's caches."""
+    from config import RESULT_CACHE_MAX_AGE_SECONDS
+
+    if RESULT_CACHE_MAX_AGE_SECONDS:
+        days = RESULT_CACHE_MAX_AGE_SECONDS / 86400
+        kept_for = f"for up to **{days:g} day{'' if days == 1 else 's'}** after their last use"
+    else:
+        kept_for = "until the cache runs out of space"
+    return (
+        "To answer repeat uploads quickly, the document text and the output are cached on the prototype's "
+        f"server {kept_for}, and are then deleted."
+    )
+
 def main():
+    start_cache_pruning()
     create_header()
 
     st.title("Prototype AI Key Information Summary Generator")
     with st.expander("### Instructions for Using the Prototype GPT-4 Key Information Generator"):
-        st.markdown("""
+        st.markdown(f"""
 #### Purpose
 This prototype is exclusively designed for generating **Key Information (KI) sections** of informed consent documents related to **biomedical research**. It is important to note that it has not been developed or tested for use with social/behavioral informed consents. The KI output from this prototype is considered a **draft**, and the **Principal Investigator (PI)/study team** bears full responsibility for evaluating its content and accuracy before submission to the Institutional Review Board (IRB).
 
 #### Input of Information
 
 - **Documents Eligibility**: Only input informed consent documents where **all sections**, except for the KI section, are fully drafted. The prototype's effectiveness depends on the complete and accurate information from other sections of the consent document to construct the KI section.
-- **Accepted Formats**: The prototype accepts inputs in PDF, Word, or text file formats. The output will be provided in text format, which then must be **copied into the informed consent document, reviewed, and edited**. Please note that the output is **not saved** within the prototype.
+- **Accepted Formats**: The prototype accepts inputs in PDF, Word, or text file formats. The output will be provided in text format, which then must be **copied into the informed consent document, reviewed, and edited**. {cache_retention_note()}
 
 #### Restrictions
 
@@ -67,22 +162,40 @@ It is crucial to avoid entering the following materials into the prototype due t
         else:
             st.success(f"File '{uploaded_file.name}' uploaded successfully!")
 
+            upload_key = summary_job_key(uploaded_file.getvalue())
             if st.button("Generate Key Information Summary"):
-                with st.spinner("Generating the Key Information section. This may take a minute..."):
-                    if not os.path.exists(UPLOADS_DIR):
-                        os.makedirs(UPLOADS_DIR)
-                    document_path = os.path.join(UPLOADS_DIR, uploaded_file.name)
-                    with open(document_path, "wb") as file:
-                        file.write(uploaded_file.getbuffer())
-
-                    response = execute_script(document_path)
-
-                    # Display the response in a text area
-                    st.title("Key Information")
-                    st.text_area(label="Key Information Summary", label_visibility="hidden",value=response, height=500, disabled=False)
-                    
-                    # Provide a download button for the summary
-                    st.download_button("Download Summary", data=response, file_name="summary.txt", mime="text/plain")
+                st.session_state["summary_job"] = start_summary_job(uploaded_file.name, uploaded_file.getvalue())
+
+            # The job outlives this script run, so other widget interactions only re-attach to it; an
+            # edited document uploaded under the same name is a different job
+            job_key = st.session_state.get("summary_job")
+            job = get_job_registry().get(job_key) if job_key == upload_key else None
+            if job is not None:
+                show_summary_job(job)
+
+def show_summary_job(job: SummaryJob):
+    """Render a job's sections as they arrive, then the finished summary."""
+    st.title("Key Information")
+    if not job.done():
+        progress = st.empty()
+        while not job.done():
+            with progress.container():
+                st.info("Generating the Key Information section. Sections appear below as they are written...")
+                for text in job.snapshot().values():
+                    st.markdown(text)
+            time.sleep(POLL_INTERVAL_SECONDS)
+        progress.empty()
+
+    if job.future.exception() is not None:
+        st.error(f"The summary could not be generated: {job.future.exception()}")
+        return
+    response = job.future.result()
+
+    # Display the response in a text area
+    st.text_area(label="Key Information Summary", label_visibility="hidden",value=response, height=500, disabled=False)
+
+    # Provide a download button for the summary
+    st.download_button("Download Summary", data=response, file_name="summary.txt", mime="text/plain")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,53 @@
+import json
+
+from batch_summary import load_checkpoint, run_batch
+
+
+def write_lines(path, records, tail: bytes = b"") -> None:
+    with open(path, "wb") as file:
+        for record in records:
+            file.write(json.dumps(record).encode() + b"\n")
+        file.write(tail)
+
+
+def test_truncated_last_line_is_dropped(tmp_path):
+    output = tmp_path / "summaries.jsonl"
+    records = [
+        {"document": "a.pdf", "document_hash": "a", "status": "ok"},
+        {"document": "b.pdf", "document_hash": "b", "status": "partial"},
+    ]
+    write_lines(output, records, tail=b'{"document": "c.pdf", "document_hash": "c", "sta')
+
+    assert load_checkpoint(str(output)) == {"a"}
+    # The torn record is cut off, so the next record starts on its own line
+    assert output.read_bytes().endswith(b'"partial"}\n')
+    assert [json.loads(line)["document"] for line in output.read_text().splitlines()] == ["a.pdf", "b.pdf"]
+
+
+def test_missing_checkpoint_is_empty(tmp_path):
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_batch_resumes_after_a_torn_record(tmp_path):
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    (documents / "a.pdf").write_bytes(b"first document")
+    (documents / "b.pdf").write_bytes(b"second document")
+    output = tmp_path / "summaries.jsonl"
+    summarized = []
+
+    async def summarize(path: str, file_bytes: bytes) -> str:
+        summarized.append(path)
+        return f"Summary of {file_bytes.decode()}"
+
+    assert run_batch(str(documents), str(output), summarize)["ok"] == 2
+    # Tear the last record as a crash mid-write would
+    lines = output.read_bytes().splitlines(keepends=True)
+    output.write_bytes(lines[0] + lines[1][:20])
+
+    summarized.clear()
+    counts = run_batch(str(documents), str(output), summarize)
+    assert (counts["skipped"], counts["ok"]) == (1, 1)
+    assert len(summarized) == 1
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(record["document"] for record in records) == sorted(str(path) for path in documents.iterdir())
@@ -0,0 +1,37 @@
+from context_assembler import assemble_context
+from scheduler import count_tokens
+
+
+def test_near_duplicate_sentences_are_sent_once():
+    passages = [
+        ("Q: dose?\nA: ", "The trial enrolled 120 adults with asthma. Dosing was twice daily."),
+        ("Q: population?\nA: ", "The trial enrolled 120 adults with mild asthma. Follow-up lasted a year."),
+    ]
+    context, stats = assemble_context(passages, duplicate_threshold=0.8)
+    assert context.count("enrolled 120 adults") == 1
+    assert "Follow-up lasted a year." in context
+    assert stats["duplicate_sentences"] == 1
+    assert stats["truncated_sentences"] == 0
+
+
+def test_short_sentences_are_only_dropped_when_repeated_exactly():
+    context, stats = assemble_context([("", "Risk is low. Risk is high. Risk is low.")])
+    assert context == "Risk is low. Risk is high."
+    assert stats["duplicate_sentences"] == 1
+
+
+def test_context_stops_at_the_token_budget():
+    sentences = [f"Sentence number {n} describes a different outcome measure." for n in range(10)]
+    passages = [("Q: one?\nA: ", " ".join(sentences[:5])), ("Q: two?\nA: ", " ".join(sentences[5:]))]
+    budget = count_tokens("Q: one?\nA: ") + 3 * count_tokens(sentences[0])
+    context, stats = assemble_context(passages, token_budget=budget, duplicate_threshold=1.0)
+    assert stats["context_tokens"] <= budget
+    assert context.startswith("Q: one?\nA: " + sentences[0])
+    assert "Q: two?" not in context
+    assert stats["truncated_sentences"] == 10 - context.count("Sentence number")
+    assert stats["context_input_tokens"] > stats["context_tokens"]
+
+
+def test_same_passages_give_the_same_context():
+    passages = [("", "Alpha beta gamma delta epsilon. Zeta eta theta iota kappa.")] * 3
+    assert assemble_context(passages, token_budget=50) == assemble_context(passages, token_budget=50)
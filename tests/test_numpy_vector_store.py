@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import numpy_vector_store
+from numpy_vector_store import EmbeddingMatrix, top_k_indices
+
+
+def graded_rows(query: np.ndarray, similarities: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Rows whose cosine similarity to the unit query is exactly the given value, each off in its own random direction."""
+    noise = rng.standard_normal((len(similarities), len(query)))
+    noise -= np.outer(noise @ query, query)
+    noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+    return similarities[:, None] * query + np.sqrt(1 - similarities ** 2)[:, None] * noise
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_top_k_order_survives_quantization(dtype, monkeypatch):
+    # Small blocks so scoring crosses several block boundaries
+    monkeypatch.setattr(numpy_vector_store, "SCORE_BLOCK_ROWS", 7)
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(256)
+    query /= np.linalg.norm(query)
+    # Similarities 0.02 apart, well above float16 and int8 rounding error, in shuffled row order
+    similarities = np.linspace(0.95, -0.5, 73)
+    order = rng.permutation(len(similarities))
+    matrix = EmbeddingMatrix(dtype=dtype)
+    # Appended in two batches, unscaled, as the store receives them
+    rows = graded_rows(query, similarities[order], rng) * 3.0
+    matrix.append(rows[:40])
+    matrix.append(rows[40:])
+
+    scores = matrix.similarities(query[None, :])
+    expected = np.argsort(-similarities[order], kind="stable")[:10]
+    np.testing.assert_array_equal(top_k_indices(scores, 10)[0], expected)
+    np.testing.assert_allclose(scores[0], similarities[order], atol=0.01)
+
+
+def test_top_k_indices_are_in_descending_order_per_query():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.4, 0.3, 0.2, 0.1]], dtype=np.float32)
+    np.testing.assert_array_equal(top_k_indices(scores, 2), [[1, 3], [0, 1]])
+    # k larger than the number of rows returns every row
+    np.testing.assert_array_equal(top_k_indices(scores, 10), [[1, 3, 2, 0], [0, 1, 2, 3]])
@@ -0,0 +1,56 @@
+import io
+
+import pypdf
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+from pdf_text import page_fingerprint
+
+
+def form_xobject_pdf(text: str) -> bytes:
+    """A one-page PDF whose text is drawn by a form XObject; its font, with an indirect encoding, is also on the page."""
+    writer = pypdf.PdfWriter()
+    page = writer.add_blank_page(612, 792)
+    encoding = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Encoding"),
+        NameObject("/Differences"): ArrayObject([NumberObject(32), NameObject("/space")]),
+    }))
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): encoding,
+    }))
+    resources = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+    form = DecodedStreamObject()
+    form.set_data(f"BT /F1 12 Tf 72 700 Td ({text}) Tj ET".encode())
+    form.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(612), NumberObject(792)]),
+        NameObject("/Resources"): resources,
+    })
+    contents = DecodedStreamObject()
+    contents.set_data(b"q /Fm0 Do Q")
+    page[NameObject("/Contents")] = writer._add_object(contents)
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        NameObject("/XObject"): DictionaryObject({NameObject("/Fm0"): writer._add_object(form)}),
+    })
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def first_page(data: bytes) -> pypdf.PageObject:
+    return pypdf.PdfReader(io.BytesIO(data)).pages[0]
+
+
+def test_fingerprint_covers_form_xobject_text():
+    safe, risky = first_page(form_xobject_pdf("Risk: none")), first_page(form_xobject_pdf("Risk: DEATH"))
+    assert "DEATH" in risky.extract_text()
+    assert page_fingerprint(safe) != page_fingerprint(risky)
+
+
+def test_fingerprint_is_stable_across_parses():
+    data = form_xobject_pdf("Risk: none")
+    assert page_fingerprint(first_page(data)) == page_fingerprint(first_page(data))
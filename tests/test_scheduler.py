@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+import scheduler
+from scheduler import RateLimiter, backoff_delay, call_with_limits
+
+
+def rate_limit_error(retry_after: str) -> openai.RateLimitError:
+    request = httpx.Request("POST", "http://127.0.0.1/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after": retry_after})
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_token_bucket_refills_over_time():
+    async def acquire_twice() -> float:
+        # 600 requests per minute refill one request every 0.1 s
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=1_000_000)
+        await limiter.acquire(tokens=1, requests=600)
+        started = time.monotonic()
+        await limiter.acquire(tokens=1, requests=1)
+        return time.monotonic() - started
+
+    assert 0.05 <= asyncio.run(acquire_twice()) < 1.0
+
+
+def test_token_budget_is_capped_at_the_bucket_size():
+    async def acquire_oversized() -> None:
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=1000)
+        await asyncio.wait_for(limiter.acquire(tokens=5000), timeout=1.0)
+
+    asyncio.run(acquire_oversized())
+
+
+def test_backoff_is_never_shorter_than_retry_after():
+    assert all(backoff_delay(attempt, retry_after=2.5) >= 2.5 for attempt in range(8))
+    assert all(backoff_delay(attempt, cap=4.0) <= 4.0 for attempt in range(8))
+
+
+def test_rate_limited_call_is_retried_after_the_pause(monkeypatch):
+    delays = []
+
+    def fixed_delay(attempt, retry_after=None):
+        delays.append(retry_after)
+        return 0.1
+
+    monkeypatch.setattr(scheduler, "backoff_delay", fixed_delay)
+    attempts = []
+
+    async def make_call() -> str:
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise rate_limit_error("0.1")
+        return "answer"
+
+    result = asyncio.run(call_with_limits("test-retry-model", 10, make_call, stage="test"))
+    assert result == "answer"
+    assert delays == [0.1]
+    assert attempts[1] - attempts[0] >= 0.09
+
+
+def test_rate_limited_call_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(scheduler, "backoff_delay", lambda attempt, retry_after=None: 0.0)
+    monkeypatch.setattr(scheduler, "MAX_RETRIES", 2)
+    attempts = []
+
+    async def make_call() -> str:
+        attempts.append(1)
+        raise rate_limit_error("0")
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(call_with_limits("test-give-up-model", 10, make_call, stage="test"))
+    assert len(attempts) == 3
@@ -0,0 +1,135 @@
+"""
+llama-index callback handler that feeds the tracing spans.
+
+Retrieval, reranking, synthesis, LLM and embedding events become child spans of whatever span
+was current when the event started. LLM spans carry prompt and completion tokens, taken from
+the API's usage report when the response has one and counted with the tokenizer otherwise (as for
+streamed answers).
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from llama_index.callbacks import CallbackManager
+from llama_index.callbacks.base_handler import BaseCallbackHandler
+from llama_index.callbacks.schema import CBEventType, EventPayload
+
+import tracing
+from scheduler import count_tokens
+
+TRACED_EVENTS = {
+    CBEventType.QUERY: "query",
+    CBEventType.RETRIEVE: "retrieve",
+    CBEventType.RERANKING: "rerank",
+    CBEventType.SYNTHESIZE: "synthesize",
+    CBEventType.LLM: "llm",
+    CBEventType.EMBEDDING: "embedding",
+}
+
+
+def _usage(response: Any) -> Optional[Dict[str, int]]:
+    raw = getattr(response, "raw", None)
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is None:
+        return None
+    if not isinstance(usage, dict):
+        usage = {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+    return {"prompt_tokens": usage.get("prompt_tokens") or 0, "completion_tokens": usage.get("completion_tokens") or 0}
+
+
+def llm_token_counts(payload: Dict[str, Any], start_payload: Dict[str, Any]) -> Dict[str, int]:
+    """Prompt and completion tokens of one finished LLM event."""
+    response = payload.get(EventPayload.RESPONSE) or payload.get(EventPayload.COMPLETION)
+    usage = _usage(response)
+    if usage is not None:
+        return usage
+    messages = start_payload.get(EventPayload.MESSAGES)
+    if messages is not None:
+        prompt_tokens = sum(count_tokens(str(message.content or "")) for message in messages)
+    else:
+        prompt_tokens = count_tokens(str(start_payload.get(EventPayload.PROMPT) or ""))
+    message = getattr(response, "message", None)
+    completion = message.content if message is not None else getattr(response, "text", response)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": count_tokens(str(completion or ""))}
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Turns llama-index events into tracing spans."""
+
+    def __init__(self) -> None:
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        # event_id -> (span, start payload, parent event_id)
+        self._open: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        parent_id: str = "",
+        **kwargs: Any,
+    ) -> str:
+        name = TRACED_EVENTS.get(event_type)
+        if name is not None:
+            with self._lock:
+                parent = self._open.get(parent_id, (None,))[0]
+            started = tracing.start_span(name, parent=parent)
+            with self._lock:
+                self._open[event_id] = (started, payload or {}, parent_id)
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = "",
+        **kwargs: Any,
+    ) -> None:
+        with self._lock:
+            started, start_payload, _ = self._open.pop(event_id, (None, None, None))
+            # llama-index does not end an LLM event whose call raised; close it with its parent
+            unfinished = [child for child, (_, _, parent_id) in self._open.items() if parent_id == event_id]
+            unfinished_spans = [self._open.pop(child)[0] for child in unfinished]
+        for unfinished_span in unfinished_spans:
+            tracing.end_span(unfinished_span, RuntimeError("event did not finish"))
+        if started is None:
+            return
+        payload = payload or {}
+        if event_type == CBEventType.LLM:
+            tokens = llm_token_counts(payload, start_payload)
+            model = _model_name(payload)
+            started.set(model=model, **tokens)
+            tracing.metrics.inc("ki_llm_tokens_total", tokens["prompt_tokens"], model=model, kind="prompt")
+            tracing.metrics.inc("ki_llm_tokens_total", tokens["completion_tokens"], model=model, kind="completion")
+        elif event_type == CBEventType.EMBEDDING:
+            started.set(texts=len(payload.get(EventPayload.CHUNKS) or []))
+        elif event_type in (CBEventType.RETRIEVE, CBEventType.RERANKING):
+            started.set(nodes=len(payload.get(EventPayload.NODES) or []))
+        tracing.end_span(started, payload.get(EventPayload.EXCEPTION))
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(self, trace_id: Optional[str] = None, trace_map: Optional[Dict[str, List[str]]] = None) -> None:
+        pass
+
+
+def _model_name(payload: Dict[str, Any]) -> str:
+    response = payload.get(EventPayload.RESPONSE) or payload.get(EventPayload.COMPLETION)
+    raw = getattr(response, "raw", None)
+    model = raw.get("model") if isinstance(raw, dict) else getattr(raw, "model", None)
+    return model or "unknown"
+
+
+_handler: Optional[TraceCallbackHandler] = None
+_handler_lock = threading.Lock()
+
+
+def get_callback_manager() -> CallbackManager:
+    """Return a callback manager reporting to the process-wide trace handler."""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = TraceCallbackHandler()
+    return CallbackManager([_handler])
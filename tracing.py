@@ -0,0 +1,307 @@
+"""
+Per-stage tracing and process-wide metrics for the summary pipeline.
+
+A trace covers one generate_summary call. Spans nest through context variables, so a span opened
+inside a task, a worker thread started with asyncio.to_thread or a llama-index callback attaches
+to the span that was current when that work began. Finished traces are written as JSON to
+TRACE_DIR from a worker thread. Span timings, OpenAI call counts, queue waits, retries, tokens and errors are also
+summed into process-wide metrics. Those metrics can be served in the Prometheus text format on
+METRICS_PORT, on METRICS_HOST (local connections only by default).
+
+This module only uses the standard library, so importing it stays cheap.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from config import METRICS_HOST, METRICS_PORT, TRACE_DIR
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("ki_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("ki_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """One timed stage. Attributes can be added while it is open."""
+
+    def __init__(self, name: str, trace: Optional["Trace"], parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, **amounts: float) -> None:
+        """Add to numeric attributes, starting from zero."""
+        for key, amount in amounts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "seconds": self.seconds,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """The spans and events of one summary."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.spans: List[Span] = []
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def totals(self) -> Dict[str, float]:
+        """Token, call, retry and queue-wait totals over every span."""
+        totals = {"openai_calls": 0, "retries": 0, "queue_wait_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.name == "openai_call":
+                totals["openai_calls"] += 1
+            for key in ("retries", "queue_wait_seconds", "prompt_tokens", "completion_tokens"):
+                totals[key] += span.attributes.get(key, 0)
+        totals["queue_wait_seconds"] = round(totals["queue_wait_seconds"], 3)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.span_id)
+            events = list(self.events)
+        totals = self.totals()
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "attributes": self.attributes,
+            "totals": totals,
+            "spans": [span.to_dict() for span in spans],
+            "events": events,
+        }
+
+
+class Metrics:
+    """Thread-safe counters rendered in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._values: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._types: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, metric_type: str = "counter", **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._types.setdefault(name, metric_type)
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one observation of a summary metric as its _sum and _count series."""
+        self.inc(f"{name}_sum", value, "summary", **labels)
+        self.inc(f"{name}_count", 1.0, "summary", **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            values = dict(self._values)
+            types = dict(self._types)
+        lines, declared = [], set()
+        for (name, labels), value in sorted(values.items()):
+            family = name.rsplit("_", 1)[0] if types[name] == "summary" else name
+            if family not in declared:
+                declared.add(family)
+                lines.append(f"# TYPE {family} {types[name]}")
+            label_text = ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+    """Open a span without making it current; use span() unless it must end in another context."""
+    parent = parent if parent is not None else _current_span.get()
+    trace = parent.trace if parent is not None else _current_trace.get()
+    return Span(name, trace, parent, attributes)
+
+
+def end_span(span: Span, error: Optional[BaseException] = None) -> None:
+    span.seconds = round(time.perf_counter() - span._start, 6)
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+        metrics.inc("ki_stage_errors_total", stage=span.name)
+    metrics.observe("ki_stage_seconds", span.seconds, stage=span.name)
+    if span.trace is not None:
+        span.trace.add_span(span)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Time a stage as a child of the current span."""
+    current = start_span(name, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        end_span(current, exc)
+        raise
+    else:
+        end_span(current)
+    finally:
+        _current_span.reset(token)
+
+
+@asynccontextmanager
+async def trace(name: str, **attributes: Any) -> AsyncIterator[Trace]:
+    """
+    Collect every span opened inside the block and write them to TRACE_DIR when it ends. The file
+    is written from a worker thread, since the block runs on the event loop every session shares.
+    """
+    maybe_start_metrics_server()
+    current_trace = Trace(name, attributes)
+    trace_token = _current_trace.set(current_trace)
+    span_token = _current_span.set(None)
+    try:
+        with span(name, **attributes):
+            yield current_trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if TRACE_DIR:
+            await asyncio.to_thread(_save_trace, current_trace)
+
+
+def _save_trace(current_trace: Trace) -> None:
+    try:
+        write_trace(current_trace, TRACE_DIR)
+    except OSError:
+        logger.exception("Could not write trace %s", current_trace.trace_id)
+
+
+def timed(iterable: Iterable[T], target: Span, attribute: str) -> Iterator[T]:
+    """Yield from iterable, adding the time spent producing each item to one of target's attributes."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            target.add(**{attribute: time.perf_counter() - start})
+            return
+        target.add(**{attribute: time.perf_counter() - start})
+        yield item
+
+
+def record_exception(event: str, exc: BaseException, **attributes: Any) -> None:
+    """Keep a handled exception as a structured event on the current trace and in the metrics."""
+    current = _current_span.get()
+    payload = {
+        "event": event,
+        "time": time.time(),
+        "span_id": current.span_id if current is not None else None,
+        "error_type": type(exc).__name__,
+        "error": str(exc),
+        **attributes,
+    }
+    current_trace = current.trace if current is not None else _current_trace.get()
+    if current_trace is not None:
+        current_trace.add_event(payload)
+    metrics.inc("ki_events_total", event=event)
+    logger.warning("%s: %s", event, json.dumps(payload, ensure_ascii=False, default=str))
+
+
+def write_trace(current_trace: Trace, directory: str) -> str:
+    """Write a finished trace as JSON, replacing the file atomically, and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    started = time.strftime("%Y%m%dT%H%M%S", time.gmtime(current_trace.start))
+    trace_path = os.path.join(directory, f"{started}-{current_trace.trace_id}.json")
+    fd, staging_path = tempfile.mkstemp(dir=directory, prefix=".staging-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(current_trace.to_dict(), file, ensure_ascii=False, indent=2, default=str)
+    os.replace(staging_path, trace_path)
+    return trace_path
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_server_started = False
+_metrics_lock = threading.Lock()
+
+
+def maybe_start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on host and port from a daemon thread, once per process; port 0 disables it."""
+    global _metrics_server, _metrics_server_started
+    if not port:
+        return None
+    with _metrics_lock:
+        if not _metrics_server_started:
+            _metrics_server_started = True
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+            except OSError:
+                logger.exception("Could not serve metrics on %s:%d", host, port)
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="ki-metrics", daemon=True).start()
+    return _metrics_server